@@ -0,0 +1,320 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import sha256
+import json
+import os
+from pathlib import Path, PurePosixPath
+import stat
+import struct
+import tarfile
+import typing as T
+import zipfile
+import zlib
+
+from utils import WrapFile, cache_dir, file_sha256, write_json_atomic
+
+INDEX_VERSION = 1
+SEARCH_CHUNK_SIZE = 1 << 20
+# members are deflated in chunks of this size, several at once
+DEFLATE_CHUNK_SIZE = 1 << 20
+DEFLATE_WINDOW = 1 << 15
+# 1980-01-01 00:00:00, the earliest time a zip can record
+ZIP_DOS_DATE = (1 << 5) | 1
+ZIP_DOS_TIME = 0
+
+class Member(T.NamedTuple):
+    size: int
+    # 'file', 'dir', 'symlink', 'hardlink' or 'other'
+    type: str
+    # tar: offset of the member data in the uncompressed stream
+    # zip: offset of the local file header
+    offset: int
+
+def _normalize(name: str) -> str:
+    while name.startswith('./'):
+        name = name[2:]
+    return name.rstrip('/')
+
+def _tar_type(info: tarfile.TarInfo) -> str:
+    if info.isfile():
+        return 'file'
+    elif info.isdir():
+        return 'dir'
+    elif info.issym():
+        return 'symlink'
+    elif info.islnk():
+        return 'hardlink'
+    return 'other'
+
+def _zip_type(info: zipfile.ZipInfo) -> str:
+    if info.is_dir():
+        return 'dir'
+    mode = info.external_attr >> 16
+    if stat.S_ISLNK(mode):
+        return 'symlink'
+    return 'file'
+
+def scan_zip(zf: zipfile.ZipFile) -> dict[str, Member]:
+    # only reads the central directory
+    members: dict[str, Member] = {}
+    for zinfo in zf.infolist():
+        name = _normalize(zinfo.filename)
+        if name:
+            members[name] = Member(zinfo.file_size, _zip_type(zinfo), zinfo.header_offset)
+    return members
+
+def _scan(path: Path) -> dict[str, Member]:
+    members: dict[str, Member] = {}
+    if path.suffix == '.zip':
+        with zipfile.ZipFile(path) as zf:
+            members = scan_zip(zf)
+    else:
+        # single sequential pass over the headers
+        with tarfile.open(path, 'r|*') as tf:
+            for tinfo in tf:
+                name = _normalize(tinfo.name)
+                if name:
+                    members[name] = Member(tinfo.size, _tar_type(tinfo), tinfo.offset_data)
+    return members
+
+class ArchiveIndex:
+    '''Listing of the members of a source archive, cached on disk by
+       source_hash so that membership tests don't have to decompress the
+       archive again.'''
+
+    def __init__(self, members: dict[str, Member]):
+        self.members = members
+
+    @staticmethod
+    def _path(source_hash: str) -> Path:
+        return cache_dir('archives') / f'{source_hash}.json'
+
+    @classmethod
+    def cached(cls, source_hash: str) -> T.Optional[ArchiveIndex]:
+        try:
+            with cls._path(source_hash).open(encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] != INDEX_VERSION:
+                return None
+            return cls({k: Member(*v) for k, v in data['members'].items()})
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @classmethod
+    def load(cls, archive: Path, source_hash: str) -> ArchiveIndex:
+        '''Return the index for archive, whose contents must match
+           source_hash, scanning it if it isn't cached yet.  Raises
+           ValueError, and caches nothing, if the archive doesn't match.'''
+        index = cls.cached(source_hash)
+        if index is not None:
+            return index
+        # a truncated or stale archive would poison the cache for good
+        actual = file_sha256(archive)
+        if actual != source_hash:
+            raise ValueError(f'{archive} has sha256 {actual}, expected {source_hash}')
+        index = cls(_scan(archive))
+        path = cls._path(source_hash)
+        write_json_atomic(path, {'version': INDEX_VERSION, 'members': index.members})
+        return index
+
+    @classmethod
+    def for_wrap(cls, wrap: WrapFile) -> ArchiveIndex:
+        '''Return the index for the wrap's downloaded source archive.'''
+        assert wrap.source_filename and wrap.source_hash
+        archive = Path('subprojects', 'packagecache', wrap.source_filename)
+        return cls.load(archive, wrap.source_hash)
+
+    def __contains__(self, name: str) -> bool:
+        return _normalize(name) in self.members
+
+    def __iter__(self) -> T.Iterator[str]:
+        return iter(self.members)
+
+    def get(self, name: str) -> T.Optional[Member]:
+        return self.members.get(_normalize(name))
+
+def iter_files(archive: Path, pattern: str) -> T.Iterator[tuple[str, T.IO[bytes]]]:
+    '''Yield (member_name, file) for each regular file in the archive
+       whose path matches pattern (as in PurePath.match()), reading
+       straight from the archive without extracting it.  Each file is only
+       readable until the next one is yielded.'''
+    if archive.suffix == '.zip':
+        with zipfile.ZipFile(archive) as zf:
+            for zinfo in zf.infolist():
+                name = _normalize(zinfo.filename)
+                if _zip_type(zinfo) == 'file' and PurePosixPath(name).match(pattern):
+                    with zf.open(zinfo) as f:
+                        yield name, f
+    else:
+        with tarfile.open(archive, 'r|*') as tf:
+            for tinfo in tf:
+                name = _normalize(tinfo.name)
+                if tinfo.isfile() and PurePosixPath(name).match(pattern):
+                    f = tf.extractfile(tinfo)
+                    assert f is not None
+                    yield name, f
+
+def _file_contains(f: T.IO[bytes], needle: bytes) -> bool:
+    tail = b''
+    while True:
+        chunk = f.read(SEARCH_CHUNK_SIZE)
+        if not chunk:
+            return False
+        buf = tail + chunk
+        if needle in buf:
+            return True
+        tail = buf[-(len(needle) - 1):] if len(needle) > 1 else b''
+
+def search_files(archive: Path, pattern: str, needle: bytes) -> T.Optional[str]:
+    '''Return the name of the first file matching pattern that contains
+       needle, or None.  Stops reading the archive at the first match.'''
+    for name, f in iter_files(archive, pattern):
+        if _file_contains(f, needle):
+            return name
+    return None
+
+def list_tree(root: Path, prefix: str) -> dict[str, Path]:
+    '''Map the archive names of root and everything below it, prefixed
+       with prefix, to their paths.  Symlinks are followed.'''
+    members = {prefix: root}
+    for dirpath, dirnames, filenames in os.walk(root, followlinks=True):
+        rel = Path(dirpath).relative_to(root).as_posix()
+        base = prefix if rel == '.' else f'{prefix}/{rel}'
+        for name in dirnames + filenames:
+            members[f'{base}/{name}'] = Path(dirpath, name)
+    return members
+
+def tree_hash(members: T.Mapping[str, Path]) -> str:
+    '''Hash everything the output of write_zip() depends on: the names,
+       which members are directories or executable, and file contents.'''
+    h = sha256()
+    for name in sorted(members):
+        path = members[name]
+        if path.is_dir():
+            kind, digest = 'dir', ''
+        else:
+            kind = 'exec' if path.stat().st_mode & 0o111 else 'file'
+            digest = file_sha256(path)
+        h.update(f'{name}\0{kind}\0{digest}\n'.encode('utf-8'))
+    return h.hexdigest()
+
+class _HashingWriter:
+    def __init__(self, f: T.BinaryIO):
+        self.f = f
+        self.hash = sha256()
+        self.offset = 0
+
+    def write(self, buf: bytes) -> None:
+        self.f.write(buf)
+        self.hash.update(buf)
+        self.offset += len(buf)
+
+def _deflate(data: bytes, zdict: bytes, last: bool) -> bytes:
+    # Raw deflate.  Non-final chunks end on a byte boundary with a full
+    # flush, so the chunks' output can be concatenated into one stream;
+    # priming each with the end of the previous chunk keeps back
+    # references across the boundaries, as pigz does.
+    if zdict:
+        c = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        c = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_FULL_FLUSH)
+
+def _check_zip32(value: int, what: str) -> int:
+    if value > 0xFFFFFFFF:
+        raise ValueError(f'{what} too large for a zip without ZIP64 extensions')
+    return value
+
+def write_zip(dest: Path, members: T.Mapping[str, Path], jobs: T.Optional[int] = None) -> str:
+    '''Write a reproducible zip of members, which maps archive names to
+       files or directories, and return its sha256.  Entries are sorted,
+       timestamps are fixed, permissions are 0644 or 0755, and each file
+       is read once, deflated in chunks on jobs threads and hashed as it
+       is written.  The output depends only on the names and contents.'''
+    jobs = jobs or os.cpu_count() or 1
+    central: list[bytes] = []
+    with dest.open('wb') as f, ThreadPoolExecutor(jobs) as executor:
+        out = _HashingWriter(f)
+        for name in sorted(members):
+            path = members[name]
+            is_dir = path.is_dir()
+            arcname = (name.rstrip('/') + '/' if is_dir else name).encode('utf-8')
+            # general purpose flags: UTF-8 names, sizes in a data descriptor
+            flags = 0 if arcname.isascii() else 0x800
+            if is_dir:
+                method = zipfile.ZIP_STORED
+                mode = stat.S_IFDIR | 0o755
+                external_attr = (mode << 16) | 0x10
+            else:
+                method = zipfile.ZIP_DEFLATED
+                flags |= 0x08
+                executable = path.stat().st_mode & 0o111
+                mode = stat.S_IFREG | (0o755 if executable else 0o644)
+                external_attr = mode << 16
+            offset = out.offset
+            out.write(struct.pack(
+                '<IHHHHHIIIHH', 0x04034b50, 20, flags, method,
+                ZIP_DOS_TIME, ZIP_DOS_DATE, 0, 0, 0, len(arcname), 0,
+            ))
+            out.write(arcname)
+
+            crc = compressed_size = size = 0
+            if not is_dir:
+                pending: deque[Future[bytes]] = deque()
+                with path.open('rb') as src:
+                    chunk = src.read(DEFLATE_CHUNK_SIZE)
+                    zdict = b''
+                    while True:
+                        next_chunk = src.read(DEFLATE_CHUNK_SIZE)
+                        crc = zlib.crc32(chunk, crc)
+                        size += len(chunk)
+                        pending.append(executor.submit(_deflate, chunk, zdict, not next_chunk))
+                        if not next_chunk:
+                            break
+                        zdict = chunk[-DEFLATE_WINDOW:]
+                        chunk = next_chunk
+                        # bound the amount of data held in memory
+                        while len(pending) > jobs:
+                            buf = pending.popleft().result()
+                            compressed_size += len(buf)
+                            out.write(buf)
+                while pending:
+                    buf = pending.popleft().result()
+                    compressed_size += len(buf)
+                    out.write(buf)
+                _check_zip32(size, name)
+                _check_zip32(compressed_size, name)
+                out.write(struct.pack('<IIII', 0x08074b50, crc, compressed_size, size))
+
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, (3 << 8) | 20, 20, flags, method,
+                ZIP_DOS_TIME, ZIP_DOS_DATE, crc, compressed_size, size,
+                len(arcname), 0, 0, 0, 0, external_attr, _check_zip32(offset, 'archive'),
+            ) + arcname)
+
+        if len(central) >= 0xFFFF:
+            raise ValueError('too many members for a zip without ZIP64 extensions')
+        cd_offset = out.offset
+        for entry in central:
+            out.write(entry)
+        out.write(struct.pack(
+            '<IHHHHIIH', 0x06054b50, 0, 0, len(central), len(central),
+            _check_zip32(out.offset - cd_offset, 'central directory'),
+            _check_zip32(cd_offset, 'archive'), 0,
+        ))
+    return out.hash.hexdigest()
@@ -15,26 +15,181 @@
 # limitations under the License.
 
 from __future__ import annotations
+from hashlib import sha256
 import io
+import os
+import re
 import sys
 import shutil
-import hashlib
-import requests
 import tempfile
 import typing as T
 import subprocess
 import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
-from utils import CIConfig, Releases, is_ci, is_debianlike, read_wrap, write_wrap
+from archives import list_tree, tree_hash, write_zip
+from downloadcache import DownloadCache, DownloadError
+from github_api import GitHubClient, ReleaseIndex
+from metadata import MetadataStore
+from utils import CIConfig, Releases, cache_dir, file_sha256, is_ci, is_debianlike, read_wrap, temp_path, wrap_path, write_json_atomic, write_wrap
+
+# number of releases to create at once
+RELEASE_JOBS_ENV = 'RELEASE_JOBS'
+DEFAULT_RELEASE_JOBS = 4
+# combined upload bandwidth limit in MiB/s
+UPLOAD_RATE_ENV = 'RELEASE_UPLOAD_RATE'
+
+PATCH_INDEX_VERSION = 1
+GENERATOR_CACHE_VERSION = 2
+
+# generator.sh scripts may install packages and write to the source tree
+generator_lock = threading.Lock()
+
+class PatchIndex:
+    '''Local index from packagefiles tree hashes (see archives.tree_hash)
+       to the release whose patch zip was built from that tree, so that a
+       release with unchanged packagefiles can point at the published
+       zip instead of building and uploading an identical one.'''
+
+    def __init__(self) -> None:
+        self.path = cache_dir('patches') / 'index.json'
+        self.lock = threading.Lock()
+        self.entries: dict[str, dict[str, str]] = {}
+        try:
+            with self.path.open(encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] == PATCH_INDEX_VERSION:
+                self.entries = data['entries']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def get(self, tree: str) -> T.Optional[dict[str, str]]:
+        with self.lock:
+            return self.entries.get(tree)
+
+    def add(self, tree: str, tag: str, patch_filename: str, patch_hash: str) -> None:
+        with self.lock:
+            self.entries[tree] = {
+                'tag': tag,
+                'patch_filename': patch_filename,
+                'patch_hash': patch_hash,
+            }
+
+    def save(self) -> None:
+        with self.lock:
+            write_json_atomic(self.path, {'version': PATCH_INDEX_VERSION, 'entries': self.entries})
+
+class GeneratorCache:
+    '''Effects of a generator.sh script on its directory -- the files it
+       wrote and the files it deleted -- cached under a hash of the files
+       tracked in the directory, the wrap file and the environment
+       variables the script mentions, so that an unchanged generator
+       doesn't have to run again.'''
+
+    def __init__(self, generator: Path, wrap: Path):
+        self.srcdir = generator.parent
+        cmd = ['git', 'ls-files', '-z', '--', self.srcdir.as_posix()]
+        tracked = [Path(p) for p in subprocess.check_output(cmd, text=True).split('\0') if p]
+        self.inputs = {p: file_sha256(p) for p in tracked if p.is_file()}
+        # everything present before the generator runs, to find deletions
+        self.before = self._files()
+        h = sha256()
+        h.update(f'version\0{GENERATOR_CACHE_VERSION}\n'.encode('utf-8'))
+        for path in sorted(self.inputs):
+            h.update(f'{path.as_posix()}\0{self.inputs[path]}\n'.encode('utf-8'))
+        h.update(f'wrap\0{file_sha256(wrap)}\n'.encode('utf-8'))
+        script = generator.read_text(encoding='utf-8')
+        for var in sorted(set(re.findall(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)', script))):
+            if var in os.environ:
+                h.update(f'env\0{var}\0{os.environ[var]}\n'.encode('utf-8'))
+        self.path = cache_dir('generators') / h.hexdigest()
+
+    def _files(self) -> set[Path]:
+        return {
+            Path(dirpath, filename)
+            for dirpath, _, filenames in os.walk(self.srcdir)
+            for filename in filenames
+        }
+
+    def _clear(self, path: Path) -> None:
+        # remove the untracked files under path, as the generator would
+        if path.is_dir() and not path.is_symlink():
+            for dirpath, _, filenames in os.walk(path, topdown=False):
+                for filename in filenames:
+                    self._clear(Path(dirpath, filename))
+                try:
+                    Path(dirpath).rmdir()
+                except OSError:
+                    # contains tracked files
+                    pass
+        elif path not in self.inputs:
+            path.unlink(missing_ok=True)
+
+    def _remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        # and any directories that leaves empty
+        for parent in path.parents:
+            if parent == self.srcdir:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def restore(self) -> bool:
+        files = self.path / 'files'
+        if not files.is_dir():
+            return False
+        with (self.path / 'deleted.json').open(encoding='utf-8') as f:
+            deleted = json.load(f)
+        # replace earlier output rather than merging with it
+        for entry in files.iterdir():
+            self._clear(self.srcdir / entry.name)
+        for name in deleted:
+            self._remove(self.srcdir / name)
+        shutil.copytree(files, self.srcdir, dirs_exist_ok=True)
+        return True
+
+    def save(self) -> None:
+        '''Store the files the generator created or modified, and the
+           names of those it deleted.'''
+        temp = temp_path(self.path)
+        if temp.exists():
+            shutil.rmtree(temp)
+        (temp / 'files').mkdir(parents=True)
+        after = self._files()
+        for path in sorted(after):
+            if path in self.inputs and file_sha256(path) == self.inputs[path]:
+                continue
+            dest = temp / 'files' / path.relative_to(self.srcdir)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, dest)
+        deleted = sorted(p.relative_to(self.srcdir).as_posix() for p in self.before - after)
+        with (temp / 'deleted.json').open('w', encoding='utf-8') as f:
+            json.dump(deleted, f)
+        try:
+            os.replace(temp, self.path)
+        except OSError:
+            # stored concurrently by another run
+            shutil.rmtree(temp)
 
 class CreateRelease:
-    def __init__(self, repo: T.Optional[str], token: T.Optional[str], tag: str):
+    def __init__(self, github: T.Optional[GitHubClient], tag: str,
+                 releases: T.Optional[ReleaseIndex] = None,
+                 patches: T.Optional[PatchIndex] = None):
         print('Preparing release for:', tag)
         self.tag = tag
         self.name, self.version = self.tag.rsplit('_', 1)
-        self.repo = repo
-        self.token = token
+        self.github = github
+        if github is not None and releases is None:
+            releases = ReleaseIndex.load(github)
+        self.releases = releases
+        self.patches = patches
+        # set when this release publishes a new patch zip
+        self.patch_entry: T.Optional[tuple[str, str, str]] = None
 
         with tempfile.TemporaryDirectory() as self.tempdir:
             self.read_wrap()
@@ -43,6 +198,8 @@ class CreateRelease:
             self.create_patch_zip()
             self.create_wrap_file()
             self.finalize()
+        if self.patches and self.patch_entry:
+            self.patches.add(*self.patch_entry)
 
     def warn(self, message: str) -> None:
         if is_ci():
@@ -54,6 +211,23 @@ class CreateRelease:
         self.wrap = read_wrap(self.name)
         self.wrap_section = self.wrap[self.wrap.sections()[0]]
 
+    def run_generator(self, generator: Path) -> None:
+        try:
+            ci = CIConfig.load()
+        except json.decoder.JSONDecodeError as ex:
+            raise RuntimeError(f'CI config is malformed') from ex
+
+        debian_packages = ci.get(self.name, {}).get('debian_packages', [])
+        if debian_packages and is_debianlike():
+            if is_ci():
+                subprocess.check_call(['sudo', 'apt-get', 'update'])
+                subprocess.check_call(['sudo', 'apt-get', '-y', 'install'] + debian_packages)
+            else:
+                s = ', '.join(debian_packages)
+                print(f'The following packages could be required: {s}')
+
+        subprocess.check_call([generator])
+
     def create_patch_zip(self) -> None:
         patch_directory = self.wrap_section.get('patch_directory')
         if patch_directory is None:
@@ -61,48 +235,50 @@ class CreateRelease:
 
         directory = self.wrap_section.get('directory', self.name)
         srcdir = Path('subprojects', 'packagefiles', patch_directory)
-        destdir = Path(self.tempdir, directory)
 
         generator = Path(srcdir, 'generator.sh')
         if generator.exists():
-            try:
-                ci = CIConfig.load()
-            except json.decoder.JSONDecodeError as ex:
-                raise RuntimeError(f'CI config is malformed') from ex
-
-            debian_packages = ci.get(self.name, {}).get('debian_packages', [])
-            if debian_packages and is_debianlike():
-                if is_ci():
-                    subprocess.check_call(['sudo', 'apt-get', 'update'])
-                    subprocess.check_call(['sudo', 'apt-get', '-y', 'install'] + debian_packages)
+            with generator_lock:
+                cache = GeneratorCache(generator, wrap_path(self.name))
+                if cache.restore():
+                    print('Restored generator.sh output from:', cache.path)
                 else:
-                    s = ', '.join(debian_packages)
-                    print(f'The following packages could be required: {s}')
-
-            subprocess.check_call([generator])
-
-        shutil.copytree(srcdir, destdir)
-        # If no specific license is specified, copy wrapdb's
-        license_file = destdir / 'LICENSE.build'
-        if not license_file.exists():
-            shutil.copyfile('COPYING', license_file)
-
-        base_name = Path(self.tempdir, f'{self.tag}_patch')
-        shutil.make_archive(base_name.as_posix(), 'zip', root_dir=self.tempdir, base_dir=directory)
-
-        patch_filename = base_name.with_name(f'{base_name.name}.zip')
-        self.upload(patch_filename, 'application/zip')
-
-        h = hashlib.sha256()
-        h.update(patch_filename.read_bytes())
-        patch_hash = h.hexdigest()
+                    self.run_generator(generator)
+                    cache.save()
+
+        members = list_tree(srcdir, directory)
+        # If no specific license is specified, use wrapdb's
+        members.setdefault(f'{directory}/LICENSE.build', Path('COPYING'))
+
+        tree = tree_hash(members)
+        previous = self.patches.get(tree) if self.patches else None
+        if previous and self.patch_published(previous['tag'], previous['patch_filename'], previous['patch_hash']):
+            # e.g. a revision bump that didn't touch the packagefiles
+            print('Reusing patch zip from:', previous['tag'])
+            tag = previous['tag']
+            patch_name = previous['patch_filename']
+            patch_hash = previous['patch_hash']
+        else:
+            tag = self.tag
+            patch_filename = Path(self.tempdir, f'{self.tag}_patch.zip')
+            patch_hash = write_zip(patch_filename, members)
+            self.upload(patch_filename, 'application/zip')
+            patch_name = patch_filename.name
+            self.patch_entry = (tree, tag, patch_name, patch_hash)
 
         del self.wrap_section['patch_directory']
-        self.wrap_section['patch_filename'] = patch_filename.name
-        self.wrap_section['patch_url'] = f'https://wrapdb.mesonbuild.com/v2/{self.tag}/get_patch'
-        self.wrap_section['patch_fallback_url'] = f'https://github.com/mesonbuild/wrapdb/releases/download/{self.tag}/{patch_filename.name}'
+        self.wrap_section['patch_filename'] = patch_name
+        self.wrap_section['patch_url'] = f'https://wrapdb.mesonbuild.com/v2/{tag}/get_patch'
+        self.wrap_section['patch_fallback_url'] = f'https://github.com/mesonbuild/wrapdb/releases/download/{tag}/{patch_name}'
         self.wrap_section['patch_hash'] = patch_hash
 
+    def patch_published(self, tag: str, patch_filename: str, patch_hash: str) -> bool:
+        if self.github is None:
+            path = Path('subprojects', 'packagecache', patch_filename)
+            return path.exists() and file_sha256(path) == patch_hash
+        assert self.releases is not None
+        return any(not r.draft and patch_filename in r.assets for r in self.releases.get(tag))
+
     def create_wrap_file(self) -> None:
         self.wrap_section['wrapdb_version'] = self.version
 
@@ -114,21 +290,16 @@ class CreateRelease:
         self.upload(filename, 'text/plain')
 
     def find_upload_url(self) -> None:
-        if not self.repo or not self.token:
+        if self.github is None:
             return
-        api = f'https://api.github.com/repos/{self.repo}/releases'
-        headers = { 'Authorization': f'token {self.token}' }
-        response = requests.get(api, headers=headers)
-        response.raise_for_status()
-        for r in response.json():
-            if r['tag_name'] == self.tag:
-                if r['draft']:
-                    delete_api = f'https://api.github.com/repos/{self.repo}/releases/{r["id"]}'
-                    response = requests.delete(delete_api, headers=headers)
-                    response.raise_for_status()
-                    print('Deleted stale release draft:', r['id'])
-                else:
-                    raise Exception('Refusing to recreate existing release')
+        assert self.releases is not None
+        for r in self.releases.get(self.tag):
+            if r.draft:
+                self.github.delete(f'releases/{r.id}')
+                self.releases.remove(self.tag, r.id)
+                print('Deleted stale release draft:', r.id)
+            else:
+                raise Exception('Refusing to recreate existing release')
 
         cmd = ['git', 'rev-parse', 'HEAD']
         commit = subprocess.check_output(cmd, text=True).strip()
@@ -138,60 +309,50 @@ class CreateRelease:
             'target_commitish': commit,
             'draft': True,
         }
-        response = requests.post(api, headers=headers, json=content)
-        response.raise_for_status()
-        r = response.json()
+        r = self.github.post('releases', json=content).json()
+        self.releases.add(r)
         self.release_id = r['id']
         self.upload_url = r['upload_url'].replace('{?name,label}','')
         print('Created release:', self.upload_url)
 
     def upload(self, path: Path, mimetype: str) -> None:
-        if not self.repo or not self.token:
-            # Write files locally when not run on CI
-            with Path('subprojects', 'packagecache', path.name).open('wb') as f:
-                f.write(path.read_bytes())
+        if self.github is None:
+            # Write files locally when not run on CI.  Replace rather than
+            # overwrite, since the destination may be hard linked into the
+            # download cache.
+            dest = Path('subprojects', 'packagecache', path.name)
+            temp = temp_path(dest)
+            shutil.copyfile(path, temp)
+            os.replace(temp, dest)
             return
-        headers = {
-            'Authorization': f'token {self.token}',
-            'Content-Type': mimetype,
-        }
-        params = { 'name': path.name }
-        response = requests.post(self.upload_url, headers=headers, params=params, data=path.read_bytes())
-        response.raise_for_status()
+        self.github.upload(self.upload_url, path, mimetype)
+        assert self.releases is not None
+        self.releases.update(self.tag, self.release_id, asset=path.name)
 
     def create_source_fallback(self) -> None:
-        for url in (self.wrap_section['source_url'],
-                    self.wrap_section.get('source_fallback_url')):
-            if url is None:
-                continue
-            try:
-                response = requests.get(url, headers={'User-Agent': 'wrapdb/0'})
-                response.raise_for_status()
-                digest = hashlib.sha256(response.content).hexdigest()
-                if digest != self.wrap_section['source_hash']:
-                    raise Exception(f'Hash mismatch for {url} ({len(response.content)} bytes): expected {self.wrap_section["source_hash"]}, found {digest}')
-                # we don't rewrite the wrap's source_url, even if we had to
-                # use the source_fallback_url instead
-                break
-            except Exception as ex:
-                self.warn(str(ex))
-        else:
+        cache = DownloadCache()
+        try:
+            # we don't rewrite the wrap's source_url, even if we had to
+            # use the source_fallback_url instead
+            path = cache.fetch([self.wrap_section['source_url'],
+                                self.wrap_section.get('source_fallback_url')],
+                               self.wrap_section['source_hash'])
+        except DownloadError as ex:
+            self.warn(str(ex))
             self.warn("Couldn't download source archive; skipping creation of source fallback")
             return
 
         filename = Path(self.tempdir, self.wrap_section['source_filename'])
-        filename.write_bytes(response.content)
+        cache.link(path, filename)
         self.upload(filename, 'application/zip')
         self.wrap_section['source_fallback_url'] = f'https://wrapdb.mesonbuild.com/v2/{self.tag}/get_source/{filename.name}'
 
     def finalize(self) -> None:
-        if not self.repo or not self.token:
+        if self.github is None:
             return
-        api = f'https://api.github.com/repos/{self.repo}/releases/{self.release_id}'
-        headers = { 'Authorization': f'token {self.token}' }
-        content = { 'draft': False }
-        response = requests.patch(api, headers=headers, json=content)
-        response.raise_for_status()
+        self.github.patch(f'releases/{self.release_id}', json={'draft': False})
+        assert self.releases is not None
+        self.releases.update(self.tag, self.release_id, draft=False)
         print('Published release:', self.upload_url)
 
 def generate_site(releases: Releases) -> None:
@@ -201,16 +362,40 @@ def generate_site(releases: Releases) -> None:
     site.mkdir()
     releases.save(dir=site, compact=True)
 
+def create_releases(github: T.Optional[GitHubClient], tags: T.Iterable[str], jobs: int) -> dict[str, Exception]:
+    '''Create releases for the tags on a pool of workers, and return the
+       exceptions from those that failed.'''
+    failures: dict[str, Exception] = {}
+    tags = list(tags)
+    if not tags:
+        # nothing to release; don't spend API calls listing releases
+        return failures
+    # list the existing releases once, rather than once per tag
+    releases = ReleaseIndex.load(github) if github is not None else None
+    patches = PatchIndex()
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {tag: executor.submit(CreateRelease, github, tag, releases, patches) for tag in tags}
+        for tag, future in futures.items():
+            try:
+                future.result()
+            except Exception as ex:
+                traceback.print_exception(type(ex), ex, ex.__traceback__)
+                failures[tag] = ex
+    patches.save()
+    return failures
+
 def run(repo: T.Optional[str], token: T.Optional[str]) -> None:
-    releases = Releases.load()
-    stdout = subprocess.check_output(['git', 'tag'])
-    tags = [t.strip() for t in stdout.decode().splitlines()]
-    for name, info in releases.items():
-        versions = info['versions']
-        latest_tag = f'{name}_{versions[0]}'
-        if latest_tag not in tags:
-            CreateRelease(repo, token, latest_tag)
-    generate_site(releases)
+    with MetadataStore.open() as store:
+        tags = list(store.latest_tags().values())
+    github = None
+    if repo and token:
+        rate = os.environ.get(UPLOAD_RATE_ENV)
+        github = GitHubClient(repo, token, upload_rate=float(rate) * (1 << 20) if rate else None)
+    jobs = int(os.environ.get(RELEASE_JOBS_ENV, DEFAULT_RELEASE_JOBS))
+    failures = create_releases(github, tags, jobs)
+    if failures:
+        raise Exception(f"Couldn't create {len(failures)} releases: {', '.join(failures)}")
+    generate_site(Releases.load())
 
 if __name__ == '__main__':
     # Support local testing when passing no arguments
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from hashlib import sha256
+import heapq
+import json
+from pathlib import Path
+import re
+import typing as T
+
+from utils import Releases, cache_dir, checkout_id, get_wrap, wrap_path, write_json_atomic
+
+INDEX_VERSION = 1
+CALL_REGEX = re.compile(r"\b(dependency|find_program|subproject)\(\s*((?:'[^']*'\s*,\s*)*'[^']*')")
+
+class _FileEntry(T.TypedDict):
+    stat: list[int]
+    sha256: str
+    data: T.Any
+
+class _Sidecar:
+    '''Per-file parse results, reused while a file's stat or content hash
+       is unchanged.'''
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, _FileEntry] = {}
+        self.used: set[str] = set()
+        self.dirty = False
+        try:
+            with path.open(encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = data['files']
+        except (OSError, ValueError):
+            pass
+
+    def get(self, path: Path, parse: T.Callable[[bytes], T.Any]) -> T.Any:
+        key = path.as_posix()
+        self.used.add(key)
+        st = path.stat()
+        stat = [st.st_mtime_ns, st.st_size]
+        entry = self.entries.get(key)
+        if entry and entry['stat'] == stat:
+            return entry['data']
+        contents = path.read_bytes()
+        digest = sha256(contents).hexdigest()
+        self.dirty = True
+        if entry and entry['sha256'] == digest:
+            entry['stat'] = stat
+            return entry['data']
+        data = parse(contents)
+        self.entries[key] = {'stat': stat, 'sha256': digest, 'data': data}
+        return data
+
+    def save(self) -> None:
+        if not self.dirty and self.used == set(self.entries):
+            return
+        files = {k: v for k, v in self.entries.items() if k in self.used}
+        write_json_atomic(self.path, {'version': INDEX_VERSION, 'files': files})
+
+def _parse_wrap(name: str) -> T.Callable[[bytes], T.Any]:
+    def parse(_: bytes) -> T.Any:
+        return get_wrap(name).patch_directory
+    return parse
+
+def _parse_calls(contents: bytes) -> T.Any:
+    calls = []
+    for func, args in CALL_REGEX.findall(contents.decode('utf-8')):
+        for arg in re.findall(r"'([^']*)'", args):
+            calls.append([func, arg])
+    return calls
+
+class DependencyGraph:
+    '''Index of what each wrap provides (from releases.json) and consumes
+       (from dependency(), find_program() and subproject() calls in its
+       packagefiles).  Upstream meson.build files aren't in the tree, so
+       only ports have outgoing edges.'''
+
+    def __init__(self, releases: Releases, calls: dict[str, list[tuple[str, str]]]):
+        self.releases = releases
+        self.dependency_providers: dict[str, str] = {}
+        self.program_providers: dict[str, str] = {}
+        for name, info in releases.items():
+            for dep in info.get('dependency_names', []):
+                self.dependency_providers.setdefault(dep, name)
+            for prog in info.get('program_names', []):
+                self.program_providers.setdefault(prog, name)
+
+        self.requires: dict[str, set[str]] = {name: set() for name in releases}
+        self.consumers: dict[str, set[str]] = {name: set() for name in releases}
+        for name, wrap_calls in calls.items():
+            for func, arg in wrap_calls:
+                if func == 'dependency':
+                    provider = self.dependency_providers.get(arg)
+                elif func == 'find_program':
+                    provider = self.program_providers.get(arg)
+                else:
+                    provider = arg if arg in releases else None
+                if provider and provider != name:
+                    self.requires[name].add(provider)
+                    self.consumers[provider].add(name)
+
+    @classmethod
+    def load(cls, releases: T.Optional[Releases] = None) -> DependencyGraph:
+        if releases is None:
+            releases = Releases.load()
+        sidecar = _Sidecar(cache_dir('depgraph') / f'{checkout_id()}.json')
+        calls: dict[str, list[tuple[str, str]]] = {}
+        for name in releases:
+            patch_directory = sidecar.get(wrap_path(name), _parse_wrap(name))
+            if not patch_directory:
+                continue
+            calls[name] = []
+            for path in sorted(Path('subprojects', 'packagefiles', patch_directory).rglob('meson.build')):
+                calls[name] += [(f, a) for f, a in sidecar.get(path, _parse_calls)]
+        sidecar.save()
+        return cls(releases, calls)
+
+    def provider_of_dependency(self, dep: str) -> T.Optional[str]:
+        return self.dependency_providers.get(dep)
+
+    def provider_of_program(self, prog: str) -> T.Optional[str]:
+        return self.program_providers.get(prog)
+
+    def closure(self, names: T.Iterable[str]) -> set[str]:
+        '''Return the named wraps plus every wrap they transitively
+           require.'''
+        result = set(names)
+        queue = list(result)
+        while queue:
+            for provider in self.requires.get(queue.pop(), ()):
+                if provider not in result:
+                    result.add(provider)
+                    queue.append(provider)
+        return result
+
+    def reverse_closure(self, names: T.Iterable[str]) -> set[str]:
+        '''Return the named wraps plus every wrap that transitively
+           consumes one of them.'''
+        result = set(names)
+        queue = list(result)
+        while queue:
+            for consumer in self.consumers.get(queue.pop(), ()):
+                if consumer not in result:
+                    result.add(consumer)
+                    queue.append(consumer)
+        return result
+
+    def topological_order(self, names: T.Optional[T.Iterable[str]] = None) -> list[str]:
+        '''Order wraps so that providers come before their consumers,
+           otherwise keeping releases.json order.  Raises ValueError for
+           unknown wraps or on a dependency cycle.'''
+        selected = set(self.releases if names is None else names)
+        unknown = selected - set(self.releases)
+        if unknown:
+            raise ValueError(f'Unknown wraps: {", ".join(sorted(unknown))}')
+        index = {n: i for i, n in enumerate(self.releases)}
+        pending = {n: len(self.requires[n] & selected) for n in selected}
+        # heap of (releases.json index, name), so the earliest ready wrap
+        # always comes next
+        ready = [(index[n], n) for n in selected if not pending[n]]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            _, name = heapq.heappop(ready)
+            order.append(name)
+            for consumer in self.consumers[name]:
+                if consumer in pending:
+                    pending[consumer] -= 1
+                    if not pending[consumer]:
+                        heapq.heappush(ready, (index[consumer], consumer))
+        if len(order) != len(selected):
+            raise ValueError(f'Dependency cycle among: {sorted(selected - set(order))}')
+        return order
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog='depgraph.py',
+        description='Query which wraps provide and consume dependencies.',
+    )
+    subparsers = parser.add_subparsers(metavar='subcommand', required=True)
+
+    provider = subparsers.add_parser(
+        'provider', help='show the wrap providing a dependency or program'
+    )
+    provider.add_argument('names', metavar='name', nargs='+')
+    provider.add_argument(
+        '-p', '--program', action='store_true',
+        help='look up program names instead of dependency names'
+    )
+    provider.set_defaults(op='provider')
+
+    rdeps = subparsers.add_parser(
+        'rdeps', help='list wraps that transitively consume the specified wraps'
+    )
+    rdeps.add_argument('names', metavar='name', nargs='+')
+    rdeps.set_defaults(op='rdeps')
+
+    order = subparsers.add_parser(
+        'order', help='list wraps with providers before consumers'
+    )
+    order.add_argument('names', metavar='name', nargs='*')
+    order.set_defaults(op='order')
+
+    args = parser.parse_args()
+    graph = DependencyGraph.load()
+    try:
+        if args.op == 'provider':
+            lookup = graph.provider_of_program if args.program else graph.provider_of_dependency
+            for name in args.names:
+                print(f'{name}: {lookup(name) or "-"}')
+        elif args.op == 'rdeps':
+            unknown = set(args.names) - set(graph.releases)
+            if unknown:
+                raise ValueError(f'Unknown wraps: {", ".join(sorted(unknown))}')
+            closure = graph.reverse_closure(args.names)
+            print('\n'.join(graph.topological_order(closure - set(args.names))))
+        elif args.op == 'order':
+            print('\n'.join(graph.topological_order(args.names or None)))
+    except ValueError as ex:
+        parser.error(str(ex))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from contextlib import contextmanager
+from hashlib import sha256
+import json
+import os
+from pathlib import Path
+import queue
+import shutil
+import threading
+import time
+import typing as T
+import urllib.request
+from urllib.parse import urlsplit
+
+from utils import WrapFile, cache_dir, get_wrap, temp_path, write_json_atomic
+
+try:
+    import fcntl
+except ImportError:
+    # Windows; concurrent processes may download the same file twice
+    fcntl = None  # type: ignore[assignment]
+
+try:
+    from http_client import get_client
+except ImportError:
+    # requests not installed; fall back to urllib without resuming
+    get_client = None  # type: ignore[assignment]
+
+DEFAULT_MAX_SIZE = 4 << 30
+# maximum cache size in MiB
+MAX_SIZE_ENV = 'WRAPDB_DOWNLOAD_CACHE_SIZE'
+CHUNK_SIZE = 1 << 20
+# start downloading from the next URL if the current ones haven't sent
+# anything after HEDGE_LATENCY seconds, or are averaging less than
+# HEDGE_THROUGHPUT bytes/second after HEDGE_WINDOW seconds
+HEDGE_LATENCY = 5.0
+HEDGE_WINDOW = 10.0
+HEDGE_THROUGHPUT = 256 << 10
+HEDGE_POLL_INTERVAL = 0.5
+# partial downloads untouched for this many seconds are deleted
+STALE_PART_AGE = 24 * 60 * 60
+# weight of the newest sample in the per-host moving averages
+STATS_WEIGHT = 0.3
+USER_AGENT = 'wrapdb/0'
+
+class DownloadError(Exception):
+    pass
+
+class _Cancelled(Exception):
+    pass
+
+class _Attempt:
+    '''One of possibly several concurrent downloads of the same file.'''
+
+    def __init__(self, url: str, part: Path, expected: T.Optional[str]):
+        self.url = url
+        self.expected = expected
+        self.host = urlsplit(url).hostname or ''
+        self.part = part
+        self.cancel = threading.Event()
+        self.started = time.monotonic()
+        self.first_byte: T.Optional[float] = None
+        self.finished: T.Optional[float] = None
+        self.received = 0
+        self.digest: T.Optional[str] = None
+        self.error: T.Optional[str] = None
+
+    def progress(self, size: int) -> None:
+        # called from the download thread
+        if self.cancel.is_set():
+            raise _Cancelled()
+        if self.first_byte is None:
+            self.first_byte = time.monotonic()
+        self.received += size
+
+    def slow(self, now: float) -> bool:
+        elapsed = now - self.started
+        if self.first_byte is None:
+            return elapsed > HEDGE_LATENCY
+        return elapsed > HEDGE_WINDOW and self.received / elapsed < HEDGE_THROUGHPUT
+
+class HostStats:
+    '''Moving averages of time to first byte and throughput per host,
+       so later downloads can start with the faster mirror.'''
+
+    def __init__(self, path: Path, hosts: dict[str, dict[str, float]]):
+        self.path = path
+        self.hosts = hosts
+
+    @classmethod
+    def load(cls) -> HostStats:
+        path = cache_dir('hosts') / 'stats.json'
+        try:
+            with path.open(encoding='utf-8') as f:
+                hosts = json.load(f)
+        except (OSError, ValueError):
+            hosts = {}
+        return cls(path, hosts)
+
+    def rank(self, urls: list[str]) -> list[str]:
+        '''Order URLs by their hosts' throughput, if all are known;
+           otherwise keep the caller's preference.'''
+        throughput = {}
+        for url in urls:
+            host = self.hosts.get(urlsplit(url).hostname or '')
+            if host is None:
+                return list(urls)
+            throughput[url] = host['throughput']
+        return sorted(urls, key=lambda u: -throughput[u])
+
+    def record(self, attempt: _Attempt) -> None:
+        if attempt.first_byte is None:
+            if not attempt.error:
+                # cancelled before receiving anything
+                return
+            latency = time.monotonic() - attempt.started
+            throughput = 0.0
+        else:
+            latency = attempt.first_byte - attempt.started
+            end = attempt.finished or time.monotonic()
+            throughput = attempt.received / max(end - attempt.first_byte, 1e-3)
+        old = self.hosts.get(attempt.host)
+        if old:
+            latency = STATS_WEIGHT * latency + (1 - STATS_WEIGHT) * old['latency']
+            throughput = STATS_WEIGHT * throughput + (1 - STATS_WEIGHT) * old['throughput']
+        self.hosts[attempt.host] = {'latency': latency, 'throughput': throughput}
+
+    def save(self) -> None:
+        write_json_atomic(self.path, self.hosts, indent=2, sort_keys=True)
+
+class DownloadCache:
+    '''Upstream source archives shared by all tools, stored by sha256.
+       Least recently used entries are evicted once the cache exceeds
+       max_size bytes.'''
+
+    def __init__(self, path: T.Optional[Path] = None, max_size: T.Optional[int] = None):
+        self.path = path or cache_dir('downloads')
+        if max_size is None:
+            env = os.environ.get(MAX_SIZE_ENV)
+            max_size = int(env) << 20 if env else DEFAULT_MAX_SIZE
+        self.max_size = max_size
+
+    @contextmanager
+    def _lock(self, key: str, shared: bool = False) -> T.Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        lock = self.path / f'{key}.lock'
+        while True:
+            with lock.open('a') as f:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                if _is_current(lock, f):
+                    yield
+                    return
+            # evict() removed the lock file while we waited; lock the new one
+
+    def lookup(self, digest: str) -> T.Optional[Path]:
+        path = self.path / digest
+        try:
+            # bump mtime for LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _urllib_download(self, url: str, temp: Path, progress: T.Callable[[int], None]) -> str:
+        hash = sha256()
+        req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(req) as resp, temp.open('wb') as f:
+            while True:
+                buf = resp.read1(CHUNK_SIZE)
+                if not buf:
+                    break
+                hash.update(buf)
+                f.write(buf)
+                progress(len(buf))
+        return hash.hexdigest()
+
+    def _run(self, attempt: _Attempt, results: queue.Queue[_Attempt]) -> None:
+        try:
+            if get_client is not None:
+                attempt.digest = get_client().download(attempt.url, attempt.part, attempt.progress,
+                                                       attempt.expected)
+            else:
+                attempt.digest = self._urllib_download(attempt.url, attempt.part, attempt.progress)
+        except _Cancelled:
+            # another URL won; nothing to resume
+            attempt.part.unlink(missing_ok=True)
+            attempt.part.with_name(f'{attempt.part.name}.json').unlink(missing_ok=True)
+            return
+        except Exception as ex:
+            attempt.error = f'{attempt.url}: {ex}'
+            if get_client is None:
+                attempt.part.unlink(missing_ok=True)
+        attempt.finished = time.monotonic()
+        results.put(attempt)
+
+    def _part_path(self, url: str, digest: T.Optional[str]) -> Path:
+        name = f'{digest or "download"}.{sha256(url.encode()).hexdigest()[:16]}'
+        if get_client is None:
+            # can't resume, so don't share with other processes
+            name += f'.{os.getpid()}'
+        return self.path / f'{name}.part'
+
+    def _download(self, urls: list[str], digest: T.Optional[str]) -> Path:
+        stats = HostStats.load()
+        # only reorder URLs whose results can be told apart by their hash
+        pending = stats.rank(urls) if digest else list(urls)
+        attempts: list[_Attempt] = []
+        running: list[_Attempt] = []
+        results: queue.Queue[_Attempt] = queue.Queue()
+        errors = []
+        winner = None
+
+        def start() -> None:
+            url = pending.pop(0)
+            attempt = _Attempt(url, self._part_path(url, digest), digest)
+            attempts.append(attempt)
+            running.append(attempt)
+            threading.Thread(target=self._run, args=(attempt, results), daemon=True).start()
+
+        start()
+        while running:
+            try:
+                attempt = results.get(timeout=HEDGE_POLL_INTERVAL)
+            except queue.Empty:
+                # hedge: if everything in flight is slow, start the next
+                # URL too and keep whichever finishes first
+                now = time.monotonic()
+                if pending and all(a.slow(now) for a in running):
+                    start()
+                continue
+            running.remove(attempt)
+            if not attempt.error and digest and attempt.digest != digest:
+                attempt.error = f'Hash mismatch for {attempt.url} ({attempt.part.stat().st_size} bytes): expected {digest}, found {attempt.digest}'
+                attempt.part.unlink(missing_ok=True)
+            if attempt.error:
+                errors.append(attempt.error)
+                if pending and not running:
+                    start()
+                continue
+            winner = attempt
+            break
+        for attempt in running:
+            attempt.cancel.set()
+
+        for attempt in attempts:
+            stats.record(attempt)
+        stats.save()
+
+        if winner is None:
+            raise DownloadError('; '.join(errors))
+        assert winner.digest
+        path = self.path / winner.digest
+        os.replace(winner.part, path)
+        self.evict()
+        return path
+
+    def fetch(self, urls: T.Iterable[T.Optional[str]], digest: T.Optional[str] = None) -> Path:
+        '''Return the cached file with the specified sha256, downloading
+           it if necessary.  URLs are tried in order of their hosts'
+           past performance; if a download is slow to start or slow to
+           proceed, the next URL is fetched in parallel and the first
+           complete download with the right hash wins.  If digest is None,
+           always download from the first URL alone, and cache the result
+           under its hash; fallback URLs aren't necessarily byte-identical
+           mirrors, so without a hash to check there's no telling which
+           of them produced the right file.'''
+        url_list = [u for u in urls if u is not None]
+        if not url_list:
+            raise DownloadError('No URLs to download')
+        if digest is None:
+            url_list = url_list[:1]
+        with self._lock(digest or sha256(' '.join(url_list).encode()).hexdigest()):
+            if digest:
+                path = self.lookup(digest)
+                if path:
+                    return path
+            return self._download(url_list, digest)
+
+    def discard(self, digest: str, copy: Path) -> None:
+        '''Remove the cached file for digest if copy is a hard link to it,
+           i.e. if a corrupted copy means the cache is corrupted too.'''
+        path = self.path / digest
+        with self._lock(digest):
+            try:
+                if path.samefile(copy):
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def link(self, path: Path, dest: Path) -> None:
+        '''Hard link a cached file to dest, or copy it if the filesystem
+           can't.'''
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        temp = temp_path(dest)
+        with self._lock(path.name, shared=True):
+            try:
+                os.link(path, temp)
+            except OSError:
+                shutil.copyfile(path, temp)
+        os.replace(temp, dest)
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        now = time.time()
+        for f in self.path.iterdir():
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            if f.suffix == '.lock':
+                # left behind by fetches that failed or weren't keyed by digest
+                if not (self.path / f.stem).exists() and now - st.st_mtime > STALE_PART_AGE:
+                    self._try_remove(f.stem)
+                continue
+            if f.suffix:
+                # partial downloads that haven't been resumed
+                if now - st.st_mtime > STALE_PART_AGE:
+                    f.unlink(missing_ok=True)
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        entries.sort()
+        for _, size, f in entries:
+            if total <= self.max_size:
+                break
+            if self._try_remove(f.name):
+                total -= size
+
+    def _try_remove(self, key: str) -> bool:
+        '''Remove the entry for key along with its lock file, unless someone
+           holds the lock.'''
+        path = self.path / key
+        if fcntl is None:
+            path.unlink(missing_ok=True)
+            return True
+        lock = self.path / f'{key}.lock'
+        with lock.open('a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # being downloaded or linked
+                return False
+            if not _is_current(lock, f):
+                # removed and recreated under us
+                return False
+            path.unlink(missing_ok=True)
+            # _lock() notices that the file it waited on is gone and retries
+            lock.unlink()
+            return True
+
+def _is_current(lock: Path, f: T.IO[str]) -> bool:
+    '''Whether the open file f is still the one at lock, i.e. whether
+       evict() removed it while we were waiting for it.'''
+    try:
+        return os.path.samestat(os.fstat(f.fileno()), lock.stat())
+    except FileNotFoundError:
+        return False
+
+def ensure_packagecache(wrap: WrapFile, cache: T.Optional[DownloadCache] = None) -> Path:
+    '''Make sure the wrap's source archive is in subprojects/packagecache,
+       where Meson will find it, and return its path.'''
+    assert wrap.source_filename and wrap.source_hash
+    dest = Path('subprojects', 'packagecache', wrap.source_filename)
+    if not dest.exists():
+        cache = cache or DownloadCache()
+        path = cache.fetch([wrap.source_url, wrap.source_fallback_url], wrap.source_hash)
+        cache.link(path, dest)
+    return dest
+
+def fill_packagecache(names: T.Iterable[str]) -> list[str]:
+    '''Run ensure_packagecache() for each wrap that has a source archive,
+       and return the names of those that couldn't be downloaded.'''
+    cache = DownloadCache()
+    failed = []
+    for name in names:
+        wrap = get_wrap(name)
+        if not wrap.source_filename or not wrap.source_hash:
+            continue
+        try:
+            ensure_packagecache(wrap, cache)
+        except DownloadError as ex:
+            print(f'{name}: {ex}')
+            failed.append(name)
+    return failed
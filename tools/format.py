@@ -16,25 +16,23 @@
 
 from __future__ import annotations
 from pathlib import Path
-import subprocess
 
-from utils import Releases, format_meson, format_wrap, read_wrap
+from metadata import MetadataStore
+from utils import Releases, format_meson, format_wrap, get_wrap
 
 FORMAT_FILES = {'meson.build', 'meson_options.txt', 'meson.options'}
 
 def main() -> None:
-    releases = Releases.load()
-    tags = set(subprocess.check_output(['git', 'tag', '--merged'], text=True).splitlines())
+    with MetadataStore.open() as store:
+        names = store.latest_tags(merged_only=True)
 
     files = []
-    for name, info in releases.items():
-        if f'{name}_{info["versions"][0]}' not in tags:
-            format_wrap(name)
-            config = read_wrap(name)
-            patch_dir_name = config['wrap-file'].get('patch_directory')
-            if patch_dir_name:
-                patch_dir = Path('subprojects', 'packagefiles', patch_dir_name)
-                files += [f for f in patch_dir.rglob('*') if f.name in FORMAT_FILES]
+    for name in names:
+        format_wrap(name)
+        patch_dir_name = get_wrap(name).patch_directory
+        if patch_dir_name:
+            patch_dir = Path('subprojects', 'packagefiles', patch_dir_name)
+            files += [f for f in patch_dir.rglob('*') if f.name in FORMAT_FILES]
 
     format_meson(files)
     Releases.format()
@@ -0,0 +1,244 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import threading
+import time
+import typing as T
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+from http_client import HTTPClient, get_client
+
+DEFAULT_API_URL = 'https://api.github.com'
+# GitHub asks for at least a second between content-creating requests
+MUTATION_INTERVAL = 1.0
+# give up rather than sleep longer than this for a rate limit
+MAX_RATE_LIMIT_WAIT = 15 * 60
+RATE_LIMIT_RETRIES = 5
+UPLOAD_BLOCK_SIZE = 1 << 16
+RELEASES_PER_PAGE = 100
+PAGE_JOBS = 8
+
+class BandwidthBudget:
+    '''Token bucket shared by all uploads, limiting their combined rate to
+       rate bytes/second.  A rate of None means unlimited.'''
+
+    def __init__(self, rate: T.Optional[float]):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.available = rate or 0.0
+        self.updated = time.monotonic()
+
+    def consume(self, size: int) -> None:
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            # allow at most one second of burst
+            self.available = min(self.rate, self.available + (now - self.updated) * self.rate)
+            self.available -= size
+            self.updated = now
+            delay = -self.available / self.rate if self.available < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+class _ThrottledFile:
+    '''File wrapper that charges reads against a BandwidthBudget.  Has a
+       length, so requests still sends Content-Length.'''
+
+    def __init__(self, f: T.BinaryIO, size: int, budget: BandwidthBudget):
+        self.f = f
+        self.size = size
+        self.budget = budget
+
+    def __len__(self) -> int:
+        return self.size
+
+    def read(self, size: int = -1) -> bytes:
+        buf = self.f.read(UPLOAD_BLOCK_SIZE if size < 0 else min(size, UPLOAD_BLOCK_SIZE))
+        self.budget.consume(len(buf))
+        return buf
+
+class GitHubClient:
+    '''Thread-safe client for the GitHub REST API.  Waits out primary rate
+       limits (X-RateLimit-*) before they're hit and secondary rate limits
+       (Retry-After) when reported, spaces out content-creating requests,
+       and throttles uploads to a shared bandwidth budget.'''
+
+    def __init__(self, repo: str, token: str, *, api_url: T.Optional[str] = None,
+                 upload_rate: T.Optional[float] = None,
+                 client: T.Optional[HTTPClient] = None):
+        self.repo = repo
+        self.api_url = (api_url or os.environ.get('GITHUB_API_URL') or DEFAULT_API_URL).rstrip('/')
+        self.headers = {
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github+json',
+        }
+        self.client = client or get_client()
+        self.budget = BandwidthBudget(upload_rate)
+        self.lock = threading.Lock()
+        self.mutation_lock = threading.Lock()
+        self.last_mutation = 0.0
+        self.remaining: T.Optional[int] = None
+        self.reset = 0.0
+
+    def repo_url(self, path: str) -> str:
+        return f'{self.api_url}/repos/{self.repo}/{path.lstrip("/")}'
+
+    def _wait(self, until: float) -> None:
+        delay = until - time.time()
+        if delay > MAX_RATE_LIMIT_WAIT:
+            raise Exception(f'GitHub rate limit resets in {delay:.0f} seconds; giving up')
+        if delay > 0:
+            print(f'Waiting {delay:.0f} seconds for GitHub rate limit')
+            time.sleep(delay)
+
+    def _update_limits(self, resp: requests.Response) -> None:
+        remaining = resp.headers.get('X-RateLimit-Remaining')
+        reset = resp.headers.get('X-RateLimit-Reset')
+        if remaining is not None and reset is not None:
+            with self.lock:
+                self.remaining = int(remaining)
+                self.reset = float(reset)
+
+    def request(self, method: str, url: str, **kwargs: T.Any) -> requests.Response:
+        '''Send a request, waiting for rate limits, and raise for error
+           statuses.  url may be a path relative to the repo.'''
+        if '://' not in url:
+            url = self.repo_url(url)
+        headers = dict(self.headers, **kwargs.pop('headers', {}))
+        mutation = method.upper() != 'GET'
+        for attempt in range(RATE_LIMIT_RETRIES):
+            with self.lock:
+                exhausted = self.remaining == 0 and self.reset > time.time()
+                reset = self.reset
+            if exhausted:
+                self._wait(reset + 1)
+            if mutation:
+                with self.mutation_lock:
+                    self._wait_interval()
+                    resp = self.client.request(method, url, headers=headers, **kwargs)
+            else:
+                resp = self.client.request(method, url, headers=headers, **kwargs)
+            self._update_limits(resp)
+            if resp.status_code in {403, 429}:
+                retry_after = resp.headers.get('Retry-After')
+                if retry_after is not None:
+                    # secondary rate limit
+                    self._wait(time.time() + float(retry_after))
+                    continue
+                if resp.headers.get('X-RateLimit-Remaining') == '0':
+                    self._wait(float(resp.headers['X-RateLimit-Reset']) + 1)
+                    continue
+            resp.raise_for_status()
+            return resp
+        resp.raise_for_status()
+        raise Exception(f'Repeated rate limiting from {url}')
+
+    def _wait_interval(self) -> None:
+        # called with mutation_lock held
+        delay = self.last_mutation + MUTATION_INTERVAL - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self.last_mutation = time.monotonic()
+
+    def get(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def upload(self, upload_url: str, path: Path, mimetype: str) -> requests.Response:
+        '''Upload a release asset, streaming it from disk within the
+           bandwidth budget.  Uploads aren't spaced out like other
+           content-creating requests, so they can run concurrently.'''
+        headers = dict(self.headers, **{'Content-Type': mimetype})
+        with path.open('rb') as f:
+            body = _ThrottledFile(f, path.stat().st_size, self.budget)
+            resp = self.client.post(upload_url, headers=headers,
+                                    params={'name': path.name}, data=body)
+        self._update_limits(resp)
+        resp.raise_for_status()
+        return resp
+
+class ReleaseInfo(T.NamedTuple):
+    id: int
+    draft: bool
+    assets: tuple[str, ...]
+
+class ReleaseIndex:
+    '''State of every release in the repo, keyed by tag, fetched once
+       with concurrent pagination and then kept up to date by the caller
+       as releases are created, deleted or changed.  Thread-safe.'''
+
+    def __init__(self, releases: T.Iterable[dict[str, T.Any]]):
+        self.lock = threading.Lock()
+        self.releases: dict[str, list[ReleaseInfo]] = {}
+        for r in releases:
+            self.add(r)
+
+    @classmethod
+    def load(cls, github: GitHubClient) -> ReleaseIndex:
+        def get_page(page: int) -> list[dict[str, T.Any]]:
+            return github.get('releases', params={'per_page': RELEASES_PER_PAGE, 'page': page}).json()
+
+        first = github.get('releases', params={'per_page': RELEASES_PER_PAGE, 'page': 1})
+        pages = 1
+        if 'last' in first.links:
+            query = parse_qs(urlsplit(first.links['last']['url']).query)
+            pages = int(query['page'][0])
+        releases = first.json()
+        with ThreadPoolExecutor(PAGE_JOBS) as executor:
+            for page in executor.map(get_page, range(2, pages + 1)):
+                releases += page
+        return cls(releases)
+
+    def get(self, tag: str) -> list[ReleaseInfo]:
+        with self.lock:
+            return list(self.releases.get(tag, []))
+
+    def add(self, release: dict[str, T.Any]) -> None:
+        info = ReleaseInfo(
+            release['id'], release['draft'],
+            tuple(a['name'] for a in release.get('assets', []))
+        )
+        with self.lock:
+            self.releases.setdefault(release['tag_name'], []).append(info)
+
+    def remove(self, tag: str, id: int) -> None:
+        with self.lock:
+            self.releases[tag] = [r for r in self.releases.get(tag, []) if r.id != id]
+
+    def update(self, tag: str, id: int, *, draft: T.Optional[bool] = None,
+               asset: T.Optional[str] = None) -> None:
+        '''Record that a release was published or gained an asset.'''
+        with self.lock:
+            self.releases[tag] = [
+                r._replace(
+                    draft=r.draft if draft is None else draft,
+                    assets=r.assets + (asset,) if asset else r.assets,
+                ) if r.id == id else r
+                for r in self.releases.get(tag, [])
+            ]
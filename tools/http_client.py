@@ -0,0 +1,238 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from email.utils import parsedate_to_datetime
+import functools
+from hashlib import sha256
+import json
+from pathlib import Path
+import random
+import re
+import time
+import typing as T
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import cache_dir, file_sha256, write_json_atomic
+
+USER_AGENT = 'wrapdb/0'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# methods that are safe to repeat after a failure
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+# small enough that progress callbacks run often on slow connections
+CHUNK_SIZE = 1 << 16
+
+class HTTPClient:
+    '''requests.Session wrapper shared by the tools: keeps connections to
+       each host alive, retries transient failures with jittered
+       exponential backoff, and resumes interrupted downloads.'''
+
+    def __init__(self, retries: int = 3, backoff: float = 1.0, max_backoff: float = 60,
+                 timeout: float = 60, pool_size: int = 10):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _delay(self, attempt: int, resp: T.Optional[requests.Response] = None) -> float:
+        retry_after = resp.headers.get('Retry-After') if resp is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                try:
+                    return min(max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0),
+                               self.max_backoff)
+                except (TypeError, ValueError):
+                    pass
+        # full jitter, so parallel clients don't retry in lockstep
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def request(self, method: str, url: str, *, retry: T.Optional[bool] = None,
+                **kwargs: T.Any) -> requests.Response:
+        '''Like requests.request(), but retries connection errors and
+           transient error statuses.  By default only idempotent methods
+           are retried.'''
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        attempts = self.retries + 1 if retry else 1
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except RETRY_EXCEPTIONS:
+                if last:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if resp.status_code not in RETRY_STATUSES or last:
+                return resp
+            resp.close()
+            time.sleep(self._delay(attempt, resp))
+        raise AssertionError('unreachable')
+
+    def get(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url: str, **kwargs: T.Any) -> requests.Response:
+        return self.request('DELETE', url, **kwargs)
+
+    def get_cached(self, url: str, ttl: float) -> str:
+        '''GET url through an on-disk cache and return the body.  Cached
+           responses younger than ttl seconds are returned without a
+           request; older ones are revalidated with If-None-Match or
+           If-Modified-Since.'''
+        path = cache_dir('http') / f'{sha256(url.encode()).hexdigest()}.json'
+        entry = None
+        try:
+            with path.open(encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry['url'] != url:
+                entry = None
+        except (OSError, ValueError, KeyError):
+            pass
+        now = time.time()
+        if entry and now - entry['time'] < ttl:
+            return entry['body']
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        resp = self.get(url, headers=headers)
+        if resp.status_code == 304 and entry:
+            entry['time'] = now
+        else:
+            resp.raise_for_status()
+            entry = {
+                'url': url,
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'time': now,
+                'body': resp.text,
+            }
+        write_json_atomic(path, entry)
+        return entry['body']
+
+    def download(self, url: str, part: Path,
+                 progress: T.Optional[T.Callable[[int], None]] = None,
+                 digest: T.Optional[str] = None) -> str:
+        '''Download url into part and return its sha256, hashed as it's
+           written.  If part exists from an interrupted download of the
+           same URL, continue where it stopped, provided the server
+           supports Range requests and the remote file hasn't changed
+           since.  The validator for that check is kept in a checkpoint
+           file next to part, which is removed on success.  If part turns
+           out to be complete already, it's kept unless it doesn't match
+           digest, in which case the download starts over.  progress is
+           called with the size of each chunk written; it may raise to
+           abandon the download.'''
+        checkpoint = part.with_name(f'{part.name}.json')
+        validator = None
+        try:
+            with checkpoint.open(encoding='utf-8') as f:
+                state = json.load(f)
+            if state['url'] == url:
+                validator = state['validator']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        attempt = 0
+        while True:
+            last = attempt >= self.retries
+            offset = part.stat().st_size if validator and part.exists() else 0
+            # we want the bytes of the file, not a transfer encoding of them
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                # If-Range: send the whole file if it has changed
+                headers.update({'Range': f'bytes={offset}-', 'If-Range': validator})
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as resp:
+                    if resp.status_code == 416 and offset:
+                        # nothing past offset, e.g. because an earlier run
+                        # finished the download but didn't get to use it
+                        m = re.fullmatch(r'bytes \*/(\d+)', resp.headers.get('Content-Range', ''))
+                        if not m or int(m.group(1)) == offset:
+                            hash_hex = file_sha256(part)
+                            if digest is None or hash_hex == digest:
+                                checkpoint.unlink(missing_ok=True)
+                                return hash_hex
+                        # stale or corrupt; start over without a Range
+                        part.unlink(missing_ok=True)
+                        checkpoint.unlink(missing_ok=True)
+                        validator = None
+                        continue
+                    if resp.status_code in RETRY_STATUSES and not last:
+                        time.sleep(self._delay(attempt, resp))
+                        attempt += 1
+                        continue
+                    resp.raise_for_status()
+                    if resp.status_code != 206:
+                        offset = 0
+                    validator = resp.headers.get('ETag')
+                    if not validator or validator.startswith('W/'):
+                        # weak ETags aren't allowed in If-Range
+                        validator = resp.headers.get('Last-Modified')
+                    with checkpoint.open('w', encoding='utf-8') as f:
+                        json.dump({'url': url, 'validator': validator}, f)
+                    hash = sha256()
+                    with part.open('r+b' if offset else 'wb') as f:
+                        # only a resumed download has to read anything back
+                        remaining = offset
+                        while remaining:
+                            buf = f.read(min(remaining, CHUNK_SIZE))
+                            if not buf:
+                                raise OSError(f'{part} shrank while resuming')
+                            hash.update(buf)
+                            remaining -= len(buf)
+                        f.seek(offset)
+                        f.truncate()
+                        for buf in resp.iter_content(CHUNK_SIZE):
+                            hash.update(buf)
+                            f.write(buf)
+                            if progress:
+                                progress(len(buf))
+                break
+            except RETRY_EXCEPTIONS:
+                if last:
+                    raise
+                time.sleep(self._delay(attempt))
+                attempt += 1
+        checkpoint.unlink(missing_ok=True)
+        return hash.hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def get_client() -> HTTPClient:
+    '''Return the process-wide client.'''
+    return HTTPClient()
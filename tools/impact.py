@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from argparse import ArgumentParser
+import json
+import subprocess
+import sys
+import typing as T
+
+from depgraph import DependencyGraph
+from utils import CIConfig, Releases, load_all_wraps
+
+# top-level files that affect the build of every wrap
+GLOBAL_FILES = {'meson.build', 'meson_options.txt'}
+
+def load_at(commit: str, filename: str) -> dict[str, T.Any]:
+    '''Parse a JSON file as of the specified commit, or return an empty
+       dict if it didn't exist.'''
+    try:
+        data = subprocess.check_output(
+            ['git', 'cat-file', 'blob', f'{commit}:{filename}'],
+            text=True, stderr=subprocess.DEVNULL
+        )
+    except subprocess.CalledProcessError:
+        return {}
+    return json.loads(data)
+
+def get_affected(base: str) -> list[str]:
+    '''Return the wraps affected by changes since base, including wraps
+       that consume them, in releases.json order.'''
+    releases = Releases.load()
+    ci_config = CIConfig.load()
+    changed = subprocess.check_output(
+        ['git', 'diff', '--name-only', base], text=True
+    ).splitlines()
+
+    patch_dirs: dict[str, list[str]] = {}
+    for name, wrap in load_all_wraps().items():
+        if wrap.patch_directory and name in releases:
+            patch_dirs.setdefault(wrap.patch_directory, []).append(name)
+
+    affected: set[str] = set()
+    for f in changed:
+        parts = f.split('/')
+        if f in GLOBAL_FILES:
+            return list(releases)
+        elif len(parts) == 2 and parts[0] == 'subprojects' and parts[1].endswith('.wrap'):
+            affected.add(parts[1][:-len('.wrap')])
+        elif len(parts) > 3 and parts[:2] == ['subprojects', 'packagefiles']:
+            affected.update(patch_dirs.get(parts[2], []))
+        elif f == Releases.FILENAME:
+            old_releases = load_at(base, f)
+            affected.update(n for n in releases if old_releases.get(n) != releases[n])
+        elif f == CIConfig.FILENAME:
+            old_ci = load_at(base, f)
+            for key in set(old_ci) | set(ci_config):
+                old, new = old_ci.get(key), ci_config.get(key)
+                if old == new:
+                    continue
+                if key == 'global_build_options':
+                    for opt in set(old or []) ^ set(new or []):
+                        subproject, sep, _ = opt.partition(':')
+                        if not sep or '=' in subproject:
+                            # applies to every build
+                            return list(releases)
+                        affected.add(subproject)
+                elif key.startswith('broken_'):
+                    affected.update(set(old or []) ^ set(new or []))
+                else:
+                    affected.add(key)
+
+    # build options or sources of a dependency change its consumers' builds
+    affected = DependencyGraph.load(releases).reverse_closure(affected)
+    return [name for name in releases if name in affected]
+
+def default_base() -> str:
+    return subprocess.check_output(
+        ['git', 'describe', '--tags', '--abbrev=0'], text=True
+    ).strip()
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog='impact.py',
+        description='List wraps affected by changes since a Git ref, including wraps that depend on them.',
+    )
+    parser.add_argument(
+        'base', nargs='?',
+        help='Git ref to compare against (default: most recent tag)'
+    )
+    xgroup = parser.add_mutually_exclusive_group()
+    xgroup.add_argument(
+        '-g', '--github', action='store_true',
+        help='output GitHub Actions matrix'
+    )
+    xgroup.add_argument(
+        '-j', '--json', action='store_true', help='output JSON'
+    )
+    args = parser.parse_args()
+
+    names = get_affected(args.base or default_base())
+    if args.github:
+        print('matrix=', end='')
+        json.dump({'include': [{'wrap': name} for name in names]}, sys.stdout)
+        print()
+    elif args.json:
+        json.dump(names, sys.stdout, indent=2)
+        print()
+    else:
+        for name in names:
+            print(name)
+
+
+if __name__ == '__main__':
+    main()
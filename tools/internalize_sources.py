@@ -16,39 +16,43 @@
 
 from __future__ import annotations
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import sha256
+import json
+import mmap
+import os
 from pathlib import Path
 import subprocess
+import sys
+import time
+import typing as T
 
-from utils import Releases, read_wrap, write_wrap, wrap_path
+from downloadcache import DownloadCache, fill_packagecache
+from metadata import MetadataStore
+from utils import cache_dir, checkout_id, get_wrap, load_all_wraps, positive_int, read_wrap, write_json_atomic, write_wrap, wrap_path
 
 class Internalizer:
     def __init__(self, all=False):
-        releases = Releases.load()
-        tags = set(
-            subprocess.check_output(['git', 'tag'], text=True).splitlines()
-        )
-
-        self.download = []
-        self.rewrite = {}
-        for name, info in releases.items():
-            tag = f'{name}_{info["versions"][0]}'
-            if all or tag not in tags:
-                self.download.append(name)
+        self.download: list[str]
+        self.rewrite: dict[str, str]
+        with MetadataStore.open() as store:
+            if all:
+                self.download = list(store.releases())
+                self.rewrite = {}
             else:
-                self.rewrite[name] = tag
+                self.download = list(store.latest_tags())
+                self.rewrite = store.latest_tags(untagged=False)
 
     def get_cache_key(self) -> str:
         hash = sha256()
         for name in self.download:
-            wrap = read_wrap(name)
-            wf = wrap['wrap-file']
+            wrap = get_wrap(name)
             parts = [
                 name,
-                wf['source_url'],
-                wf.get('source_fallback_url', ''),
-                wf['source_filename'],
-                wf['source_hash'],
+                wrap.source_url,
+                wrap.source_fallback_url or '',
+                wrap.source_filename,
+                wrap.source_hash,
                 '=====',
             ]
             for s in parts:
@@ -56,12 +60,13 @@ class Internalizer:
         return hash.hexdigest()[:16]
 
     def download_sources(self) -> None:
-        if self.download:
+        Path('subprojects', 'packagecache').mkdir(exist_ok=True)
+        # let Meson retry anything the download cache couldn't fetch
+        failed = fill_packagecache(self.download)
+        if failed:
             subprocess.check_call(
-                ['meson', 'subprojects', 'download'] + self.download
+                ['meson', 'subprojects', 'download'] + failed
             )
-        else:
-            Path('subprojects', 'packagecache').mkdir(exist_ok=True)
 
     def rewrite_wraps(self) -> None:
         for name, tag in self.rewrite.items():
@@ -73,6 +78,76 @@ class Internalizer:
         print(f'Rewrote source_url for {len(self.rewrite)} projects.')
 
 
+def hash_file(path: Path) -> str:
+    with path.open('rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # can't mmap an empty file
+            return sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            # hashlib drops the GIL for large buffers, so threads hash
+            # on separate cores
+            return sha256(m).hexdigest()
+
+
+def verify_cache(jobs: T.Optional[int]) -> bool:
+    '''Check archives in packagecache against the wraps' source_hash and
+       patch_hash, deleting any that don't match.  Returns True if all
+       matched.'''
+    expected: dict[str, str] = {}
+    for wrap in load_all_wraps().values():
+        if wrap.source_filename and wrap.source_hash:
+            expected[wrap.source_filename] = wrap.source_hash
+        if wrap.patch_filename and wrap.patch_hash:
+            expected[wrap.patch_filename] = wrap.patch_hash
+
+    # filename -> [size, mtime_ns, sha256] from previous runs
+    memo_path = cache_dir('verify') / f'{checkout_id()}.json'
+    try:
+        with memo_path.open(encoding='utf-8') as f:
+            memo: dict[str, list[T.Any]] = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+
+    packagecache = Path('subprojects', 'packagecache')
+    digests: dict[str, str] = {}
+    to_hash: list[tuple[Path, os.stat_result]] = []
+    unknown = 0
+    for path in sorted(packagecache.iterdir()) if packagecache.is_dir() else []:
+        if path.name not in expected or not path.is_file():
+            unknown += 1
+            continue
+        st = path.stat()
+        entry = memo.get(path.name)
+        if entry and entry[:2] == [st.st_size, st.st_mtime_ns]:
+            digests[path.name] = entry[2]
+        else:
+            to_hash.append((path, st))
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as executor:
+        for (path, st), digest in zip(to_hash, executor.map(hash_file, [p for p, _ in to_hash])):
+            digests[path.name] = digest
+            memo[path.name] = [st.st_size, st.st_mtime_ns, digest]
+    elapsed = time.monotonic() - start
+
+    cache = DownloadCache()
+    bad = sorted(name for name, digest in digests.items() if digest != expected[name])
+    for name in bad:
+        path = packagecache / name
+        print(f'{name}: expected {expected[name]}, found {digests[name]}; deleting')
+        cache.discard(expected[name], path)
+        path.unlink()
+        del memo[name]
+    memo = {name: entry for name, entry in memo.items() if name in digests}
+    write_json_atomic(memo_path, memo)
+
+    size = sum(st.st_size for _, st in to_hash) / (1 << 20)
+    print(f'Hashed {len(to_hash)} archives ({size:.1f} MiB in {elapsed:.1f}s, {size / max(elapsed, 1e-3):.0f} MiB/s); '
+          f'{len(digests) - len(to_hash)} unchanged since last run, {len(bad)} mismatched, '
+          f'{unknown} not referenced by any wrap.')
+    return not bad
+
+
 def main() -> None:
     common = ArgumentParser(add_help=False)
     common.add_argument(
@@ -101,7 +176,19 @@ def main() -> None:
     )
     rewrite.set_defaults(op='rewrite')
 
+    verify = subparsers.add_parser(
+        'verify-cache',
+        help='check packagecache archives against wrap hashes, deleting mismatches',
+        description='Check packagecache archives against wrap hashes, deleting mismatches.  Exits with status 1 if any were found.'
+    )
+    verify.add_argument(
+        '-j', '--jobs', type=positive_int, help='number of files to hash at once (default: number of CPUs)'
+    )
+    verify.set_defaults(op='verify-cache')
+
     args = parser.parse_args()
+    if args.op == 'verify-cache':
+        sys.exit(0 if verify_cache(args.jobs) else 1)
     intern = Internalizer(args.all)
     if args.op == 'cache-key':
         print(intern.get_cache_key())
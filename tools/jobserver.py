@@ -0,0 +1,80 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import select
+import shutil
+import tempfile
+import typing as T
+
+class JobServer:
+    '''Host side of the GNU make jobserver protocol, using the named pipe
+       transport understood by make >= 4.4 and ninja >= 1.13.
+
+       Unlike make, we never run jobs ourselves, so the pool holds one token
+       per job and every client we spawn first takes a token to stand in for
+       its implicit slot.  Concurrent builds then share a single budget.'''
+
+    def __init__(self, jobs: int):
+        if not hasattr(os, 'mkfifo'):
+            raise RuntimeError('jobserver is not supported on this platform')
+        self.jobs = jobs
+        self.tempdir = Path(tempfile.mkdtemp(prefix='wrapdb-jobserver-'))
+        self.path = self.tempdir / 'fifo'
+        os.mkfifo(self.path)
+        # Opening both ends keeps the pipe alive even when no client has it
+        # open, and non-blocking reads let us take tokens opportunistically.
+        self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+        os.write(self.fd, b'+' * jobs)
+
+    def close(self) -> None:
+        os.close(self.fd)
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def env(self, env: T.Optional[dict[str, str]] = None) -> dict[str, str]:
+        env = dict(os.environ if env is None else env)
+        env['MAKEFLAGS'] = f' -j{self.jobs} --jobserver-auth=fifo:{self.path}'
+        return env
+
+    def acquire(self, count: int = 1, *, block: bool = True) -> bytes:
+        '''Take up to count tokens.  If block is true, wait until at least
+           one is available.'''
+        while True:
+            try:
+                return os.read(self.fd, count)
+            except BlockingIOError:
+                if not block:
+                    return b''
+            select.select([self.fd], [], [])
+
+    def release(self, tokens: bytes) -> None:
+        if tokens:
+            os.write(self.fd, tokens)
+
+    @contextmanager
+    def slot(self, *, extra: bool = False) -> T.Iterator[int]:
+        '''Hold a token for the duration of a client process.  If extra is
+           true, also grab whatever spare tokens are free right now, for
+           clients that can't talk to the jobserver but take a parallelism
+           level up front.  Yields the number of tokens held.'''
+        tokens = self.acquire()
+        if extra:
+            tokens += self.acquire(self.jobs - 1, block=False)
+        try:
+            yield len(tokens)
+        finally:
+            self.release(tokens)
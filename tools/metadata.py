@@ -0,0 +1,150 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from hashlib import sha256
+import json
+from pathlib import Path
+import sqlite3
+import typing as T
+
+from tagindex import TagIndex
+from utils import Releases, cache_dir, checkout_id, get_wrap
+
+SCHEMA_VERSION = 2
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stamps (source TEXT PRIMARY KEY, stamp TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS releases (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    latest TEXT NOT NULL,
+    info TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS wraps (
+    name TEXT PRIMARY KEY,
+    stamp TEXT NOT NULL,
+    patch_directory TEXT,
+    source_url TEXT,
+    source_filename TEXT,
+    source_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT PRIMARY KEY,
+    merged INTEGER NOT NULL
+);
+'''
+
+def _file_hash(path: str) -> str:
+    return sha256(Path(path).read_bytes()).hexdigest()
+
+class MetadataStore:
+    '''SQLite cache of releases.json, wrap files and Git tags for the
+       current checkout.  refresh() reloads only the sources whose file
+       hashes, wrap stats or refs have changed since the last run.  Use
+       as a context manager to close the database when done.'''
+
+    def __init__(self, path: T.Optional[Path] = None):
+        self.path = path or cache_dir('metadata') / f'{checkout_id()}.sqlite'
+        self.db = sqlite3.connect(self.path)
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            with self.db:
+                for (table,) in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                    self.db.execute(f'DROP TABLE {table}')
+                self.db.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> MetadataStore:
+        return self
+
+    def __exit__(self, *args: T.Any) -> None:
+        self.close()
+
+    @classmethod
+    def open(cls) -> MetadataStore:
+        store = cls()
+        store.refresh()
+        return store
+
+    def _stamp(self, source: str) -> T.Optional[str]:
+        row = self.db.execute('SELECT stamp FROM stamps WHERE source = ?', (source,)).fetchone()
+        return row[0] if row else None
+
+    def _set_stamp(self, source: str, stamp: str) -> None:
+        self.db.execute('INSERT OR REPLACE INTO stamps VALUES (?, ?)', (source, stamp))
+
+    def refresh(self) -> None:
+        with self.db:
+            self._refresh_releases()
+            self._refresh_wraps()
+            self._refresh_tags()
+
+    def _refresh_releases(self) -> None:
+        stamp = _file_hash(Releases.FILENAME)
+        if stamp == self._stamp(Releases.FILENAME):
+            return
+        self.db.execute('DELETE FROM releases')
+        for i, (name, info) in enumerate(Releases.load().items()):
+            self.db.execute('INSERT INTO releases VALUES (?, ?, ?, ?)',
+                            (name, i, info['versions'][0], json.dumps(info)))
+        self._set_stamp(Releases.FILENAME, stamp)
+
+    def _refresh_wraps(self) -> None:
+        known = dict(self.db.execute('SELECT name, stamp FROM wraps').fetchall())
+        for path in Path('subprojects').glob('*.wrap'):
+            st = path.stat()
+            stamp = f'{st.st_mtime_ns}:{st.st_size}'
+            if known.pop(path.stem, None) == stamp:
+                continue
+            wrap = get_wrap(path.stem)
+            self.db.execute('INSERT OR REPLACE INTO wraps VALUES (?, ?, ?, ?, ?, ?)', (
+                wrap.name, stamp, wrap.patch_directory, wrap.source_url,
+                wrap.source_filename, wrap.source_hash
+            ))
+        self.db.executemany('DELETE FROM wraps WHERE name = ?', [(n,) for n in known])
+
+    def _refresh_tags(self) -> None:
+        index = TagIndex.load()
+        if index.state == self._stamp('tags'):
+            return
+        self.db.execute('DELETE FROM tags')
+        self.db.executemany('INSERT INTO tags VALUES (?, ?)',
+                            [(t, t in index.merged) for t in index.all])
+        self._set_stamp('tags', index.state)
+
+    def releases(self) -> Releases:
+        return Releases({
+            name: json.loads(info) for name, info in
+            self.db.execute('SELECT name, info FROM releases ORDER BY position')
+        })
+
+    def latest_tags(self, *, untagged: bool = True, merged_only: bool = False) -> dict[str, str]:
+        '''Return a dict: wrap_name -> tag of its latest release, for wraps
+           whose latest release has (or, if untagged is true, lacks) a tag.'''
+        condition = 'tags.merged' if merged_only else 'tags.tag IS NOT NULL'
+        if untagged:
+            condition = f'NOT coalesce({condition}, 0)'
+        return dict(self.db.execute(f'''
+            SELECT releases.name, releases.name || '_' || releases.latest AS tag
+            FROM releases LEFT JOIN tags ON tags.tag = releases.name || '_' || releases.latest
+            WHERE {condition} ORDER BY releases.position
+        '''))
+
+    def ports(self) -> list[str]:
+        return [name for (name,) in self.db.execute('''
+            SELECT releases.name FROM releases JOIN wraps USING (name)
+            WHERE wraps.patch_directory IS NOT NULL ORDER BY releases.position
+        ''')]
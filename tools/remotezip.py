@@ -0,0 +1,143 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+import http.client
+import io
+import re
+import shutil
+import tempfile
+import typing as T
+import urllib.request
+import zipfile
+
+from archives import ArchiveIndex, scan_zip
+
+# enough for the end of central directory record plus a maximal comment,
+# and usually the whole central directory of a source archive
+TAIL_SIZE = 1 << 16
+READ_AHEAD = 1 << 16
+USER_AGENT = 'wrapdb/0'
+
+class _RangeFile(io.RawIOBase):
+    '''Seekable read-only file over HTTP Range requests.  Keeps the most
+       recently fetched window, so zipfile's small sequential reads don't
+       each turn into a request.'''
+
+    def __init__(self, url: str, size: int, start: int, tail: bytes, timeout: float):
+        self.url = url
+        self.size = size
+        self.timeout = timeout
+        self.pos = 0
+        # the tail may be shorter than the server claimed
+        self.window_start = start
+        self.window = tail
+        self.requests = 1
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def _fetch(self, start: int, end: int) -> None:
+        window = b''
+        # servers may send less than the requested range; ask for the rest
+        while start + len(window) < end:
+            req = urllib.request.Request(self.url, headers={
+                'User-Agent': USER_AGENT,
+                'Range': f'bytes={start + len(window)}-{end - 1}',
+            })
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                if resp.status != 206:
+                    raise OSError(f'{self.url}: server stopped honoring Range requests')
+                buf = resp.read()
+            self.requests += 1
+            if not buf:
+                raise OSError(f'{self.url}: empty response to Range request')
+            window += buf
+        self.window = window[:end - start]
+        self.window_start = start
+
+    def readinto(self, b: T.Any) -> int:
+        end = min(self.pos + len(b), self.size)
+        if end <= self.pos:
+            return 0
+        window_end = self.window_start + len(self.window)
+        if self.pos < self.window_start or end > window_end:
+            self._fetch(self.pos, min(max(end, self.pos + READ_AHEAD), self.size))
+        offset = self.pos - self.window_start
+        n = end - self.pos
+        b[:n] = self.window[offset:offset + n]
+        self.pos = end
+        return n
+
+class RemoteZip:
+    '''Read the listing and individual members of a zip archive on an
+       HTTP server without downloading all of it.  Falls back to a full
+       download (into a temporary file) if the server ignores Range
+       requests.'''
+
+    def __init__(self, url: str, timeout: float = 30):
+        self.url = url
+        self.file: T.IO[bytes]
+        req = urllib.request.Request(url, headers={
+            'User-Agent': USER_AGENT,
+            'Range': f'bytes=-{TAIL_SIZE}',
+        })
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            m = re.fullmatch(r'bytes (\d+)-(\d+)/(\d+)', resp.headers.get('Content-Range', ''))
+            if resp.status == 206 and m:
+                self.ranged = True
+                self.file = _RangeFile(url, int(m.group(3)), int(m.group(1)), resp.read(), timeout)
+            else:
+                self.ranged = False
+                self.file = tempfile.TemporaryFile()
+                shutil.copyfileobj(resp, self.file)
+        self.zip = zipfile.ZipFile(self.file)
+
+    def __enter__(self) -> RemoteZip:
+        return self
+
+    def __exit__(self, *args: T.Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.zip.close()
+        self.file.close()
+
+    def index(self) -> ArchiveIndex:
+        return ArchiveIndex(scan_zip(self.zip))
+
+    def read(self, name: str) -> bytes:
+        return self.zip.read(name)
+
+def remote_index(url: str) -> T.Optional[ArchiveIndex]:
+    '''Return the listing of a remote zip, or None if it can't be read.'''
+    try:
+        with RemoteZip(url) as rz:
+            return rz.index()
+    except (OSError, http.client.HTTPException, zipfile.BadZipFile):
+        return None
@@ -0,0 +1,114 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from hashlib import sha256
+import json
+import os
+from pathlib import Path
+import platform
+import time
+import typing as T
+
+from utils import CIConfig, Releases, cache_dir, get_wrap, wrap_path, write_json_atomic
+
+DEFAULT_MAX_SIZE = 16 << 20
+# top-level files of the project that builds each wrap
+GLOBAL_FILES = ('meson.build', 'meson_options.txt')
+
+def fingerprint(name: str, releases: Releases, ci_config: CIConfig,
+                environment: T.Iterable[str], *,
+                deps: T.Optional[T.Iterable[str]] = None,
+                progs: T.Optional[T.Iterable[str]] = None,
+                requires: T.Iterable[str] = ()) -> str:
+    '''Hash everything that goes into building and checking a wrap: the
+       top-level meson.build and meson_options.txt, the wrap's
+       releases.json entry, the dependencies and programs it's checked
+       for, and the wrap file, packagefiles and CI config of the wrap and
+       of each wrap it requires (its dependency fallbacks), plus the
+       resolved build options and caller-supplied details of the build
+       environment.'''
+    h = sha256()
+    def add(*parts: str | bytes) -> None:
+        for p in parts:
+            h.update(p.encode() if isinstance(p, str) else p)
+            h.update(b'\0')
+
+    for f in GLOBAL_FILES:
+        add('global', f, Path(f).read_bytes())
+    add('release', json.dumps(releases.get(name, {}), sort_keys=True))
+    add('deps', *sorted(deps or []))
+    add('progs', *sorted(progs or []))
+    for wrap in [name] + sorted(set(requires) - {name}):
+        add('wrap', wrap, wrap_path(wrap).read_bytes())
+        patch_directory = get_wrap(wrap).patch_directory
+        if patch_directory:
+            patch_path = Path('subprojects', 'packagefiles', patch_directory)
+            for f in sorted(patch_path.rglob('*')):
+                if f.is_file():
+                    add('file', f.relative_to(patch_path).as_posix(), f.read_bytes())
+        add('ci', json.dumps(ci_config.get(wrap, {}), sort_keys=True))
+    add('options', *ci_config.get_option_arguments(name))
+    add('platform', platform.system(), platform.machine(), *environment)
+    return h.hexdigest()
+
+class ResultCache:
+    '''Local record of wrap fingerprints that have built successfully.
+       Least recently used entries are evicted once the store exceeds
+       max_size bytes.'''
+
+    def __init__(self, path: T.Optional[Path] = None, max_size: int = DEFAULT_MAX_SIZE):
+        self.path = path or cache_dir('results')
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, fp: str) -> Path:
+        return self.path / f'{fp}.json'
+
+    def has_passed(self, fp: str) -> bool:
+        entry = self._entry(fp)
+        try:
+            # bump mtime for LRU eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def record_pass(self, fp: str, name: str) -> None:
+        entry = self._entry(fp)
+        write_json_atomic(entry, {'name': name, 'time': time.time()})
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        total = 0
+        for f in self.path.glob('*.json'):
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+            total += st.st_size
+        entries.sort()
+        for _, size, f in entries:
+            if total <= self.max_size:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+
+    def summary(self) -> str:
+        return f'result cache: {self.hits} hits, {self.misses} misses'
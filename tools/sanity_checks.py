@@ -15,6 +15,8 @@
 # limitations under the License.
 
 from __future__ import annotations
+import concurrent.futures
+import contextlib
 import unittest
 import json
 import subprocess
@@ -27,12 +29,18 @@ import platform
 import io
 import sys
 import shutil
-import tarfile
 import textwrap
-import zipfile
+import threading
 
 from pathlib import Path
-from utils import CIConfig, ProjectCIConfig, Releases, Version, ci_group, is_ci, is_alpinelike, is_debianlike, is_macos, is_windows, is_msys, read_wrap, FormattingError, format_meson, format_wrap
+from archives import ArchiveIndex, search_files
+from depgraph import DependencyGraph
+from downloadcache import fill_packagecache
+from jobserver import JobServer
+from remotezip import remote_index
+from resultcache import ResultCache, fingerprint
+from tagindex import TagIndex, last_tag_changes
+from utils import CIConfig, ProjectCIConfig, Releases, Version, available_memory, file_sha256, ci_group, is_ci, is_alpinelike, is_debianlike, is_macos, is_windows, is_msys, load_average, read_wrap, FormattingError, format_meson, format_wrap
 
 MINIMUM_MESON_VERSION = '0.56.0'  # also in README.md
 PERMITTED_FILES = {'generator.sh', 'meson.build', 'meson_options.txt', 'meson.options', 'LICENSE.build'}
@@ -191,6 +199,8 @@ FORMAT_CHECK_FILES = {'meson.build', 'meson_options.txt', 'meson.options'}
 SUBPROJECTS_METADATA_FILES = {'subprojects/.gitignore'}
 PERMITTED_KEYS = {'versions', 'dependency_names', 'program_names'}
 IGNORE_SETUP_WARNINGS = None  # or re.compile(r'something')
+# how often test_build_all reconsiders admitting another parallel build
+ADMISSION_INTERVAL = 5
 
 
 class TestReleases(unittest.TestCase):
@@ -203,23 +213,30 @@ class TestReleases(unittest.TestCase):
     skip: list[str]
     tags: set[str]
     timeout_multiplier: float
+    build_jobs: int
+    build_batch_size: int
+    build_job_memory: int
+    install_lock: threading.Lock
+    jobserver: JobServer | None
+    result_cache: ResultCache | None
+    depgraph: DependencyGraph | None
+    meson_version: str
 
     @classmethod
     def setUpClass(cls):
         # Take list of git tags.  Ignore tags unreachable from HEAD so we
         # don't fail on tags created after the branch was pushed.
-        stdout = subprocess.check_output(['git', 'tag', '--merged'])
-        cls.tags = {t.strip() for t in stdout.decode().splitlines()}
+        tag_index = TagIndex.load()
+        cls.tags = tag_index.merged
         # Ensure we have one of the oldest tags in the repo, and roughly
         # the expected number of tags
         if 'abseil-cpp_20200225.2-1' not in cls.tags or len(cls.tags) < 2000:
             # Repo may have been cloned with --depth=N
             # git fetch --tags is not enough because we ignore tags
             # unreachable from HEAD
-            raise Exception("Missing Git tags; try 'git fetch --unshallow'")
-        stdout = subprocess.check_output(['git', 'tag', '--no-merged'])
-        if stdout.strip():
-            print(f'Ignoring unreachable tags: {stdout.decode().splitlines()}')
+            raise Exception("Missing Git tags; try 'git fetch --unshallow', or generate a manifest with tools/tag_manifest.py in a full clone and point WRAPDB_TAG_MANIFEST at it")
+        if tag_index.unmerged:
+            print(f'Ignoring unreachable tags: {sorted(tag_index.unmerged)}')
 
         try:
             cls.releases = Releases.load()
@@ -233,6 +250,36 @@ class TestReleases(unittest.TestCase):
         cls.annotate_context = os.environ.get('TEST_ANNOTATE_CONTEXT') == 'yes'
         cls.skip_build = os.environ.get('TEST_SKIP_BUILD') == 'yes'
         cls.timeout_multiplier = float(os.environ.get('TEST_TIMEOUT_MULTIPLIER', 1))
+        cls.build_jobs = int(os.environ.get('TEST_BUILD_JOBS', 1))
+        cls.build_batch_size = int(os.environ.get('TEST_BUILD_BATCH', 1))
+        # expected peak memory of one build, in MiB
+        cls.build_job_memory = int(os.environ.get('TEST_BUILD_JOB_MEMORY', 2048)) << 20
+        cls.install_lock = threading.Lock()
+        # share one -j budget between all concurrent compiles and test runs
+        jobs = os.environ.get('TEST_JOBSERVER')
+        cls.jobserver = JobServer(int(jobs)) if jobs else None
+        # skip builds whose inputs are identical to a previous passing build
+        cls.result_cache = None
+        cls.depgraph = None
+        if os.environ.get('TEST_RESULT_CACHE') == 'yes':
+            cls.result_cache = ResultCache(max_size=int(os.environ.get('TEST_RESULT_CACHE_SIZE', 16)) << 20)
+            cls.meson_version = subprocess.check_output(['meson', '--version'], text=True).strip()
+        if cls.result_cache or cls.build_jobs > 1:
+            # a build's outcome also depends on its dependency fallbacks, and
+            # parallel builds need those unpacked before they start
+            cls.depgraph = DependencyGraph.load(cls.releases)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.jobserver:
+            cls.jobserver.close()
+        if cls.result_cache:
+            print(cls.result_cache.summary())
+
+    def job_slot(self, *, extra: bool = False) -> T.ContextManager[int | None]:
+        if self.jobserver:
+            return self.jobserver.slot(extra=extra)
+        return contextlib.nullcontext()
 
     def test_releases_json(self):
         # All tags must be in the releases file
@@ -264,11 +311,46 @@ class TestReleases(unittest.TestCase):
         dir = Path('subprojects', wrap['wrap-file']['directory'])
         if not dir.exists():
             # build has not run and unpacked the source; do that
+            fill_packagecache([name])
             subprocess.check_call(
                 ['meson', 'subprojects', 'download', name]
             )
         return dir
 
+    def get_source_archive(self, name: str, wrap: configparser.ConfigParser) -> Path:
+        source_path = Path('subprojects', 'packagecache',
+                           wrap['wrap-file']['source_filename'])
+        source_hash = wrap['wrap-file']['source_hash']
+        if source_path.exists() and file_sha256(source_path) != source_hash:
+            # truncated or stale; Meson would have rejected it too
+            source_path.unlink()
+        if not source_path.exists():
+            # we don't need the unpacked and patched source but do need the
+            # downloaded source archive
+            if fill_packagecache([name]):
+                if Path('subprojects', wrap['wrap-file']['directory']).exists():
+                    # Meson won't download the archive again for an
+                    # existing source dir
+                    raise Exception(f"Couldn't download {source_path.name}")
+                # Meson verifies the hash of what it downloads
+                self.ensure_source_dir(name, wrap)
+        return source_path
+
+    def get_archive_index(self, name: str, wrap: configparser.ConfigParser) -> ArchiveIndex:
+        source_hash = wrap['wrap-file']['source_hash']
+        index = ArchiveIndex.cached(source_hash)
+        if index is not None:
+            return index
+        source_path = Path('subprojects', 'packagecache',
+                           wrap['wrap-file']['source_filename'])
+        if not source_path.exists() and source_path.suffix == '.zip':
+            # the listing is at the end of the zip; try fetching just that.
+            # Not cached since we haven't verified source_hash.
+            index = remote_index(wrap['wrap-file']['source_url'])
+            if index is not None:
+                return index
+        return ArchiveIndex.load(self.get_source_archive(name, wrap), source_hash)
+
     def check_project_version(self, name: str, version: str, patch_path: str | None, builddir: str = '_build') -> None:
         with self.subTest(step="check_project_version"):
             json_file = Path(builddir) / "meson-info/intro-projectinfo.json"
@@ -399,10 +481,11 @@ class TestReleases(unittest.TestCase):
                             has_new_releases = True
                             self.log_context(name)
                             if not self.skip_build:
-                                self.check_new_release(name, deps=deps, progs=progs)
+                                built = self.build_cached(name, deps=deps, progs=progs)
                                 with self.subTest(f'If this works now, please remove it from broken_{platform.system().lower()}!'):
                                     self.assertNotIn(name, self.ci_config.broken)
-                                self.check_project_version(name, ver, patch_path)
+                                if built:
+                                    self.check_project_version(name, ver, patch_path)
                             elif first_build:
                                 self.write_github_output_var('need-build', '1')
                         if patch_path:
@@ -419,37 +502,180 @@ class TestReleases(unittest.TestCase):
 
         with self.subTest(step='releases.json updated'):
             if not has_new_releases:
-                last_tag = subprocess.check_output(['git', 'describe', '--tags', '--abbrev=0'], text=True, encoding='utf-8').strip()
-                changed_files = subprocess.check_output(['git', 'diff', '--name-only', 'HEAD', last_tag], text=True, encoding='utf-8').splitlines()
+                _, changed_files = last_tag_changes()
                 if any(f.startswith('subprojects') and f not in SUBPROJECTS_METADATA_FILES for f in changed_files):
                     self.fail('Subprojects files changed but no new release added into releases.json')
 
     @unittest.skipUnless('TEST_BUILD_ALL' in os.environ, 'Run manually only')
     def test_build_all(self):
-        passed = []
-        skipped = []
-        failed = []
-        errored = []
-        for name, info in self.releases.items():
+        results: dict[str, str] = {}
+        names = []
+        # fingerprints of the builds to run, computed once here
+        fps: dict[str, str] = {}
+        # e.g. the output of tools/impact.py
+        selected = set(re.split(r'[\s,]+', os.environ.get('TEST_BUILD_WRAPS', ''))) - {''}
+        for name in self.releases:
+            if selected and name not in selected:
+                continue
             if name in self.ci_config.broken:
-                skipped.append(name)
+                results[name] = 'skipped'
                 continue
-            try:
-                with tempfile.TemporaryDirectory() as d:
-                    self.check_new_release(name, d)
-                    passed.append(name)
-            except unittest.SkipTest:
-                passed.append(name)
-            except subprocess.CalledProcessError:
-                failed.append(name)
-            except Exception:
-                errored.append(name)
-        print(f'{len(passed)} passed:', ', '.join(passed))
-        print(f'{len(skipped)} skipped:', ', '.join(skipped))
-        print(f'{len(failed)} failed:', ', '.join(failed))
-        print(f'{len(errored)} errored:', ', '.join(errored))
-        self.assertFalse(failed)
-        self.assertFalse(errored)
+            if self.result_cache:
+                fps[name] = self.build_fingerprint(name)
+                if self.result_cache.has_passed(fps[name]):
+                    results[name] = 'passed'
+                    continue
+            names.append(name)
+        if self.build_batch_size > 1:
+            tasks = self.group_batches(names)
+            build: T.Callable[[list[str]], dict[str, str]] = lambda group: self.build_batch(group, fps)
+        else:
+            tasks = [[name] for name in names]
+            build = lambda group: {group[0]: self.build_one(group[0], fps.get(group[0]))}
+        if self.build_jobs > 1:
+            results.update(self.build_parallel(tasks, build))
+        else:
+            for task in tasks:
+                results.update(build(task))
+        summary: dict[str, list[str]] = {s: [] for s in ('passed', 'skipped', 'failed', 'errored')}
+        for name in self.releases:
+            if name in results:
+                summary[results[name]].append(name)
+        for status, wraps in summary.items():
+            print(f'{len(wraps)} {status}:', ', '.join(wraps))
+        self.assertFalse(summary['failed'])
+        self.assertFalse(summary['errored'])
+
+    def build_one(self, name: str, fp: str | None = None) -> str:
+        try:
+            with tempfile.TemporaryDirectory() as d:
+                self.build_cached(name, d, fp=fp)
+        except unittest.SkipTest:
+            pass
+        except subprocess.CalledProcessError:
+            return 'failed'
+        except Exception:
+            return 'errored'
+        return 'passed'
+
+    def build_parallel(self, tasks: list[list[str]], build: T.Callable[[list[str]], dict[str, str]]) -> dict[str, str]:
+        # Unpack everything up front, including dependency fallbacks, so
+        # concurrent builds don't race to extract a subproject they share.
+        # Failures are reported by the individual builds.
+        assert self.depgraph is not None
+        names = sorted(self.depgraph.closure(n for t in tasks for n in t))
+        fill_packagecache(names)
+        subprocess.run(['meson', 'subprojects', 'download'] + names)
+
+        results: dict[str, str] = {}
+        pending = list(tasks)
+        running: dict[concurrent.futures.Future[dict[str, str]], str] = {}
+        with concurrent.futures.ThreadPoolExecutor(self.build_jobs) as executor:
+            while pending or running:
+                # Admit at most one build per interval, since load and
+                # memory use of a new build take a while to show up
+                if pending and len(running) < self.build_jobs and (not running or self.can_admit_build()):
+                    task = pending.pop(0)
+                    label = ', '.join(task)
+                    print(f'Starting build of {label} ({len(running) + 1} running, {len(pending)} pending)')
+                    running[executor.submit(build, task)] = label
+                done, _ = concurrent.futures.wait(running, timeout=ADMISSION_INTERVAL,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    label = running.pop(future)
+                    task_results = future.result()
+                    results.update(task_results)
+                    print(f'Finished build of {label}:', ', '.join(sorted(set(task_results.values()))))
+        return results
+
+    def group_batches(self, names: list[str]) -> list[list[str]]:
+        '''Greedily group wraps that are expected to build on this platform
+           and whose build options don't conflict.  Everything else gets a
+           group of its own.'''
+        system = self.get_system()
+        groups: list[list[str]] = []
+        open_groups: dict[bool, list[list[str]]] = {}
+        for name in names:
+            ci = self.ci_config.get(name, {})
+            if not ci.get('build_on', {}).get(system, True):
+                groups.append([name])
+                continue
+            fatal_warnings = ci.get('fatal_warnings', True)
+            candidates = open_groups.setdefault(fatal_warnings, [])
+            for group in candidates:
+                if len(group) < self.build_batch_size and self.merge_build_options(group + [name]) is not None:
+                    group.append(name)
+                    break
+            else:
+                group = [name]
+                candidates.append(group)
+                groups.append(group)
+        return groups
+
+    def merge_build_options(self, names: list[str]) -> list[str] | None:
+        '''Return the union of the -D arguments of the named wraps, or None
+           if they conflict.'''
+        global_opts = {f'-D{o}' for o in self.ci_config.global_build_options}
+        merged: dict[str, str] = {}
+        excluded: set[str] = set()
+        for name in names:
+            opts = self.ci_config.get_option_arguments(name)
+            # a wrap's own entries in global_build_options don't apply to it
+            excluded |= global_opts - set(opts)
+            for o in opts:
+                if merged.setdefault(o.split('=', 1)[0], o) != o:
+                    return None
+        if excluded & set(merged.values()):
+            return None
+        return list(merged.values())
+
+    def build_batch(self, names: list[str], fps: dict[str, str]) -> dict[str, str]:
+        '''Configure and compile a group of wraps in one build directory,
+           bisecting on failure.  Single wraps get the full check.  fps
+           holds the wraps' fingerprints, if the result cache is enabled.'''
+        if len(names) == 1:
+            return {names[0]: self.build_one(names[0], fps.get(names[0]))}
+        print(f'\nBuilding batch: {", ".join(names)}')
+        try:
+            with tempfile.TemporaryDirectory() as d:
+                ok = self.check_batch(names, d)
+        except Exception as ex:
+            print(f'Batch errored: {ex}')
+            ok = False
+        if ok:
+            return dict.fromkeys(names, 'passed')
+        half = len(names) // 2
+        print(f'Batch failed; bisecting {", ".join(names[:half])} | {", ".join(names[half:])}')
+        results = self.build_batch(names[:half], fps)
+        results.update(self.build_batch(names[half:], fps))
+        return results
+
+    def check_batch(self, names: list[str], builddir: str) -> bool:
+        options = self.merge_build_options(names)
+        assert options is not None
+        options += ['-Dpython.install_env=auto', '-Dwraps={}'.format(','.join(names))]
+        if self.ci_config.get(names[0], {}).get('fatal_warnings', True) and self.fatal_warnings:
+            options.append('--fatal-meson-warnings')
+        packages: dict[str, list[str]] = {}
+        for name in names:
+            for k, v in self.ci_config.get(name, {}).items():
+                if k.endswith('_packages'):
+                    packages.setdefault(k, []).extend(v)
+        meson_env = self.install_packages(T.cast('ProjectCIConfig', packages))
+        if subprocess.run(['meson', 'setup', builddir] + options, env=meson_env).returncode:
+            return False
+        with self.job_slot():
+            compile_env = self.jobserver.env(meson_env) if self.jobserver else meson_env
+            return subprocess.run(['meson', 'compile', '-C', builddir], env=compile_env).returncode == 0
+
+    def can_admit_build(self) -> bool:
+        load = load_average()
+        if load is not None and load >= (os.cpu_count() or 1):
+            return False
+        memory = available_memory()
+        if memory is not None and memory < self.build_job_memory:
+            return False
+        return True
 
     def check_has_no_path_separators(self, value: str) -> None:
         self.assertNotIn('/', value)
@@ -504,18 +730,47 @@ class TestReleases(unittest.TestCase):
         self.assertTrue(version in source_url or version_ in source_url,
                         f'Version {version} not found in {source_url}')
 
+    def build_cached(self, name: str, builddir: str = '_build', deps=None, progs=None,
+                     fp: str | None = None) -> bool:
+        '''Run check_new_release() unless a build with identical inputs
+           already passed.  Returns False if the build was skipped.  If the
+           caller passes the fingerprint, it has already checked that it
+           hasn't passed.'''
+        if self.result_cache and fp is None:
+            fp = self.build_fingerprint(name, deps=deps, progs=progs)
+            if self.result_cache.has_passed(fp):
+                print(f'\nSkipping build of {name}; identical inputs already passed')
+                return False
+        self.check_new_release(name, builddir, deps=deps, progs=progs)
+        if self.result_cache and fp:
+            self.result_cache.record_pass(fp, name)
+        return True
+
+    def build_fingerprint(self, name: str, deps=None, progs=None) -> str:
+        assert self.depgraph is not None
+        return fingerprint(name, self.releases, self.ci_config, [
+            self.meson_version,
+            self.get_system(),
+            str(self.fatal_warnings),
+            os.environ.get('CC', ''),
+            os.environ.get('CXX', ''),
+        ], deps=deps, progs=progs, requires=self.depgraph.closure([name]))
+
+    @staticmethod
+    def get_system() -> str:
+        if is_msys():
+            return 'msys2'
+        elif is_alpinelike():
+            return 'alpine'
+        return platform.system().lower()
+
     def log_context(self, name: str) -> None:
         if self.annotate_context and name in self.ci_config:
             print(f'\n::notice title={name} config::' + json.dumps(self.ci_config[name], indent=2).replace('\n', '%0A') + '\n')
 
     def check_new_release(self, name: str, builddir: str = '_build', deps=None, progs=None) -> None:
         print() # Ensure output starts from an empty line (we're running under unittest).
-        if is_msys():
-            system = 'msys2'
-        elif is_alpinelike():
-            system = 'alpine'
-        else:
-            system = platform.system().lower()
+        system = self.get_system()
         ci = self.ci_config.get(name, {})
         expect_working = ci.get('build_on', {}).get(system, True)
 
@@ -591,7 +846,9 @@ class TestReleases(unittest.TestCase):
                         print('cannot verify in wrapdb due to missing dependency')
                         return
             raise Exception(f'Wrap {name} failed to configure due to bugs in the wrap, rather than due to being unsupported')
-        subprocess.check_call(['meson', 'compile', '-C', builddir], env=meson_env)
+        with self.job_slot():
+            compile_env = self.jobserver.env(meson_env) if self.jobserver else meson_env
+            subprocess.check_call(['meson', 'compile', '-C', builddir], env=compile_env)
         if not ci.get('skip_tests', False):
             test_options = ci.get('test_options', [])
             if self.timeout_multiplier != 1:
@@ -607,7 +864,13 @@ class TestReleases(unittest.TestCase):
                 else:
                     test_options.append(f'--timeout-multiplier={self.timeout_multiplier}')
             try:
-                subprocess.check_call(['meson', 'test', '-C', builddir, '--suite', name, '--print-errorlogs'] + test_options)
+                with self.job_slot(extra=True) as threads:
+                    test_env = None
+                    if threads is not None:
+                        # meson test can't take tokens itself, so give it
+                        # whatever is free when it starts
+                        test_env = dict(os.environ, MESON_TESTTHREADS=str(threads))
+                    subprocess.check_call(['meson', 'test', '-C', builddir, '--suite', name, '--print-errorlogs'] + test_options, env=test_env)
             except subprocess.CalledProcessError:
                 log_file = Path(builddir, 'meson-logs', 'testlog.txt')
                 with ci_group('==== testlog.txt ===='):
@@ -625,7 +888,8 @@ class TestReleases(unittest.TestCase):
         meson_env = os.environ.copy()
         def do_install(kind, cmd, packages):
             if is_ci():
-                with ci_group(f'install {kind} packages'):
+                # package managers don't tolerate concurrent invocations
+                with self.install_lock, ci_group(f'install {kind} packages'):
                     subprocess.check_call(cmd + packages)
             else:
                 s = ', '.join(packages)
@@ -671,17 +935,28 @@ class TestReleases(unittest.TestCase):
         ret += (0,) * (3 - len(ret))
         return ret
 
-    def check_project_args(self, name: str, wrap: configparser.ConfigParser) -> None:
-        dir = self.ensure_source_dir(name, wrap)
+    def get_project_kwargs(self, dir: Path) -> dict[str, T.Any] | None:
         try:
             project_json = subprocess.check_output(
                 ['meson', 'rewrite', 'kwargs', 'info', 'project', '/'],
                 cwd=dir, text=True, stderr=subprocess.DEVNULL
             )
         except subprocess.CalledProcessError:
+            return None
+        return json.loads(project_json)['kwargs']['project#/']
+
+    def check_project_args(self, name: str, wrap: configparser.ConfigParser) -> None:
+        project = None
+        patch_path = self.get_patch_path(wrap['wrap-file'])
+        if patch_path and (patch_path / 'meson.build').exists():
+            # ports ship the top-level meson.build, so avoid unpacking the
+            # source if the rewriter can handle it on its own
+            project = self.get_project_kwargs(patch_path)
+        if project is None:
+            project = self.get_project_kwargs(self.ensure_source_dir(name, wrap))
+        if project is None:
             # rewriter fails if any compilers are missing; ignore
             return
-        project = json.loads(project_json)['kwargs']['project#/']
 
         with self.subTest(step='check_meson_version'):
             self.assertIn('meson_version', project,
@@ -727,33 +1002,25 @@ class TestReleases(unittest.TestCase):
         with self.subTest(step='check for meson.override_dependency()'):
             provides = self.get_transitional_provides(wrap)
             if provides:
-                dir = self.ensure_source_dir(name, wrap)
-                for path in dir.rglob('meson.build'):
-                    if 'meson.override_dependency' in path.read_text(encoding='utf-8'):
-                        # assume if an upstream converts to
-                        # override_dependency it converts completely
-                        raise Exception(f"{path.relative_to(dir)} contains meson.override_dependency(); wrap provides should be converted to e.g. 'dependency_names = {', '.join(sorted(provides))}'")
+                found = search_files(self.get_source_archive(name, wrap), 'meson.build',
+                                     b'meson.override_dependency')
+                if found:
+                    # member names come back without a leading ./
+                    lead = wrap['wrap-file']['directory'] + '/'
+                    if not wrap['wrap-file'].get('lead_directory_missing', False) and found.startswith(lead):
+                        found = found[len(lead):]
+                    # assume if an upstream converts to
+                    # override_dependency it converts completely
+                    raise Exception(f"{found} contains meson.override_dependency(); wrap provides should be converted to e.g. 'dependency_names = {', '.join(sorted(provides))}'")
 
     def check_for_upstream_meson(self, name: str, ver: str, wrap: configparser.ConfigParser) -> None:
         with self.subTest(step='check for upstream meson.build'):
             if ver == self.ci_config.get(name, {}).get('ignore_upstream_meson'):
                 return
-            # we don't need the unpacked and patched source but do need the
-            # downloaded source archive
-            self.ensure_source_dir(name, wrap)
-            source_path = Path('subprojects', 'packagecache',
-                               wrap['wrap-file']['source_filename'])
             member_path = 'meson.build'
             if not wrap['wrap-file'].get('lead_directory_missing', False):
                 member_path = wrap['wrap-file']['directory'] + '/' + member_path
-            try:
-                if source_path.suffix == '.zip':
-                    with zipfile.ZipFile(source_path) as zf:
-                        zf.getinfo(member_path)
-                else:
-                    with tarfile.open(source_path) as tf:
-                        tf.getmember(member_path)
-            except KeyError:
+            if member_path not in self.get_archive_index(name, wrap):
                 self.assertIsNone(self.ci_config.get(name, {}).get('ignore_upstream_meson'),
                                   'found ignore_upstream_meson in project without upstream Meson config')
             else:
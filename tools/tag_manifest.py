@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from pathlib import Path
+
+from tagindex import MANIFEST_ENV, generate_manifest, load_manifest
+from utils import write_json_atomic
+
+def main() -> None:
+    parser = ArgumentParser(
+        prog='tag_manifest.py',
+        description=f'Record Git tag state so other tools can run from a shallow clone. Point {MANIFEST_ENV} at the generated file to use it.',
+    )
+    subparsers = parser.add_subparsers(metavar='subcommand', required=True)
+
+    generate = subparsers.add_parser(
+        'generate', help='write a manifest for HEAD; needs a full clone'
+    )
+    generate.add_argument(
+        '-o', '--output', type=Path, default=Path('tag-manifest.json'),
+        help='output file (default: tag-manifest.json)'
+    )
+    generate.set_defaults(op='generate')
+
+    verify = subparsers.add_parser(
+        'verify', help='check that a manifest is well-formed and matches HEAD'
+    )
+    verify.add_argument('path', type=Path)
+    verify.set_defaults(op='verify')
+
+    args = parser.parse_args()
+    if args.op == 'generate':
+        manifest = generate_manifest()
+        write_json_atomic(args.output, manifest, sort_keys=True, separators=(',', ':'))
+        print(f'Wrote {len(manifest["tags"])} tags for {manifest["commit"]} to {args.output}')
+    elif args.op == 'verify':
+        manifest = load_manifest(args.path)
+        print(f'{args.path}: OK, {len(manifest["tags"])} tags for {manifest["commit"]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from hashlib import sha256
+import json
+import os
+from pathlib import Path
+import subprocess
+import typing as T
+
+from utils import cache_dir, checkout_id, write_json_atomic
+
+INDEX_VERSION = 1
+MANIFEST_VERSION = 1
+# path to a manifest from tag_manifest.py, used instead of local tags
+MANIFEST_ENV = 'WRAPDB_TAG_MANIFEST'
+
+class TagManifest(T.TypedDict):
+    version: int
+    commit: str
+    tags: dict[str, bool]
+    last_tag: str
+    changed_files: list[str]
+    digest: str
+
+def manifest_digest(manifest: T.Mapping[str, T.Any]) -> str:
+    '''Checksum of the manifest's own contents.  This only catches a
+       truncated or corrupted file; it says nothing about whether the tags
+       match the remote.'''
+    payload = {k: v for k, v in manifest.items() if k != 'digest'}
+    return sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def head_commit() -> str:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+
+def describe_last_tag() -> tuple[str, list[str]]:
+    '''Return the most recent tag reachable from HEAD and the files changed
+       since then.'''
+    last_tag = subprocess.check_output(['git', 'describe', '--tags', '--abbrev=0'], text=True, encoding='utf-8').strip()
+    changed_files = subprocess.check_output(['git', 'diff', '--name-only', 'HEAD', last_tag], text=True, encoding='utf-8').splitlines()
+    return last_tag, changed_files
+
+def generate_manifest() -> TagManifest:
+    last_tag, changed_files = describe_last_tag()
+    manifest: TagManifest = {
+        'version': MANIFEST_VERSION,
+        'commit': head_commit(),
+        'tags': _read_tags(),
+        'last_tag': last_tag,
+        'changed_files': changed_files,
+        'digest': '',
+    }
+    manifest['digest'] = manifest_digest(manifest)
+    return manifest
+
+def load_manifest(path: Path) -> TagManifest:
+    '''Load a manifest and check that it's well-formed and was generated for
+       the commit we have checked out.'''
+    with path.open(encoding='utf-8') as f:
+        manifest: TagManifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f'{path}: unsupported manifest version')
+    if manifest.get('digest') != manifest_digest(manifest):
+        raise ValueError(f'{path}: checksum mismatch, file is corrupt')
+    head = head_commit()
+    if manifest['commit'] != head:
+        raise ValueError(f"{path}: generated for {manifest['commit']}, but HEAD is {head}")
+    return manifest
+
+def get_manifest() -> T.Optional[TagManifest]:
+    path = os.environ.get(MANIFEST_ENV)
+    return load_manifest(Path(path)) if path else None
+
+def last_tag_changes() -> tuple[str, list[str]]:
+    '''Like describe_last_tag(), but answered from the manifest if we have
+       one, since a shallow clone can't.'''
+    manifest = get_manifest()
+    if manifest:
+        return manifest['last_tag'], manifest['changed_files']
+    return describe_last_tag()
+
+def refs_state() -> str:
+    '''Return a string that changes whenever HEAD or any tag changes.'''
+    out = subprocess.check_output(
+        ['git', 'rev-parse', '--git-common-dir', 'HEAD'], text=True
+    ).split()
+    git_dir, head = Path(out[0]), out[1]
+    parts = [head]
+    try:
+        st = (git_dir / 'packed-refs').stat()
+        parts.append(f'packed {st.st_mtime_ns} {st.st_size}')
+    except FileNotFoundError:
+        pass
+    loose = git_dir / 'refs' / 'tags'
+    for dirpath, _, filenames in os.walk(loose):
+        for f in filenames:
+            st = Path(dirpath, f).stat()
+            parts.append(f'{Path(dirpath, f).relative_to(loose).as_posix()} {st.st_mtime_ns}')
+    return '\n'.join(sorted(parts))
+
+def _read_tags() -> dict[str, bool]:
+    '''Return a dict: tag -> whether it's reachable from HEAD.'''
+    try:
+        # git >= 2.41 can report reachability in the same pass
+        out = subprocess.check_output(
+            ['git', 'for-each-ref', '--format=%(refname:strip=2) %(ahead-behind:HEAD)', 'refs/tags'],
+            text=True, stderr=subprocess.DEVNULL
+        )
+    except subprocess.CalledProcessError:
+        pass
+    else:
+        tags = {}
+        for line in out.splitlines():
+            tag, ahead, _ = line.rsplit(' ', 2)
+            tags[tag] = ahead == '0'
+        return tags
+    cmd = ['git', 'for-each-ref', '--format=%(refname:strip=2)']
+    all_tags = subprocess.check_output(cmd + ['refs/tags'], text=True).splitlines()
+    merged = set(subprocess.check_output(cmd + ['--merged=HEAD', 'refs/tags'], text=True).splitlines())
+    return {tag: tag in merged for tag in all_tags}
+
+class TagIndex:
+    '''Every release tag in the repo and whether it's reachable from HEAD.
+       Shared by all tools, and cached on disk until the refs change.'''
+
+    def __init__(self, tags: dict[str, bool], state: str):
+        self.state = state
+        self.all = set(tags)
+        self.merged = {t for t, merged in tags.items() if merged}
+        self.unmerged = self.all - self.merged
+
+    @classmethod
+    def load(cls) -> TagIndex:
+        manifest = get_manifest()
+        if manifest:
+            return cls(manifest['tags'], f"manifest {manifest['digest']}")
+        state = refs_state()
+        path = cache_dir('tags') / f'{checkout_id()}.json'
+        try:
+            with path.open(encoding='utf-8') as f:
+                data = json.load(f)
+            if data['version'] == INDEX_VERSION and data['state'] == state:
+                return cls(data['tags'], state)
+        except (OSError, ValueError, KeyError):
+            pass
+        tags = _read_tags()
+        write_json_atomic(path, {'version': INDEX_VERSION, 'state': state, 'tags': tags})
+        return cls(tags, state)
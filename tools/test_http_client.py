@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Copyright 2026 The Meson development team
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+from hashlib import sha256
+import http.server
+import json
+from pathlib import Path
+import re
+import tempfile
+import threading
+import unittest
+
+from http_client import HTTPClient
+
+DATA = bytes(range(256)) * 1024
+ETAG = '"v1"'
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # full responses sent, for checking whether a download restarted
+    full_responses = 0
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        m = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if m and self.headers.get('If-Range') == ETAG:
+            start = int(m.group(1))
+            if start >= len(DATA):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(DATA)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(DATA) - 1}/{len(DATA)}')
+        else:
+            start = 0
+            _Handler.full_responses += 1
+            self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(DATA) - start))
+        self.end_headers()
+        self.wfile.write(DATA[start:])
+
+class DownloadTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/file'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.part = Path(tempdir.name, 'file.part')
+        self.checkpoint = Path(tempdir.name, 'file.part.json')
+        self.client = HTTPClient(retries=0)
+        _Handler.full_responses = 0
+
+    def leave_part(self, contents: bytes) -> None:
+        # as left by a run that died after writing the part
+        self.part.write_bytes(contents)
+        self.checkpoint.write_text(json.dumps({'url': self.url, 'validator': ETAG}), encoding='utf-8')
+
+    def test_fresh(self) -> None:
+        digest = self.client.download(self.url, self.part)
+        self.assertEqual(digest, sha256(DATA).hexdigest())
+        self.assertEqual(self.part.read_bytes(), DATA)
+        self.assertFalse(self.checkpoint.exists())
+
+    def test_resume(self) -> None:
+        self.leave_part(DATA[:1000])
+        digest = self.client.download(self.url, self.part)
+        self.assertEqual(digest, sha256(DATA).hexdigest())
+        self.assertEqual(self.part.read_bytes(), DATA)
+        self.assertEqual(_Handler.full_responses, 0)
+
+    def test_already_complete(self) -> None:
+        self.leave_part(DATA)
+        digest = self.client.download(self.url, self.part, digest=sha256(DATA).hexdigest())
+        self.assertEqual(digest, sha256(DATA).hexdigest())
+        self.assertEqual(self.part.read_bytes(), DATA)
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(_Handler.full_responses, 0)
+
+    def test_already_complete_but_corrupt(self) -> None:
+        self.leave_part(b'x' * len(DATA))
+        digest = self.client.download(self.url, self.part, digest=sha256(DATA).hexdigest())
+        self.assertEqual(digest, sha256(DATA).hexdigest())
+        self.assertEqual(self.part.read_bytes(), DATA)
+        self.assertFalse(self.checkpoint.exists())
+        self.assertEqual(_Handler.full_responses, 1)
+
+    def test_longer_than_remote(self) -> None:
+        self.leave_part(DATA + b'extra')
+        digest = self.client.download(self.url, self.part)
+        self.assertEqual(digest, sha256(DATA).hexdigest())
+        self.assertEqual(self.part.read_bytes(), DATA)
+        self.assertEqual(_Handler.full_responses, 1)
+
+if __name__ == '__main__':
+    unittest.main()
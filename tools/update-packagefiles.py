@@ -14,39 +14,33 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import configparser
-import tarfile
-import zipfile
 import shutil
 from pathlib import Path
 
-from utils import read_wrap
+from archives import ArchiveIndex
+from utils import WrapFile, load_all_wraps
 
-def read_archive_files(path: Path, base_path: Path) -> set[Path]:
-    if path.suffix == '.zip':
-        with zipfile.ZipFile(path, 'r') as archive:
-            archive_files = set(base_path / i for i in archive.namelist())
-    else:
-        with tarfile.open(archive_path) as archive:
-            archive_files = set(base_path / i.name for i in archive)
-    return archive_files
+def read_archive_files(wrap: WrapFile, base_path: Path) -> set[Path]:
+    return set(base_path / i for i in ArchiveIndex.for_wrap(wrap))
 
 if __name__ == '__main__':
-    for f in Path('subprojects').glob('*.wrap'):
-        wrap = read_wrap(f.stem)
-        wrap_section = wrap[wrap.sections()[0]]
-        patch_directory = wrap_section.get('patch_directory')
-        if not patch_directory:
+    for wrap in load_all_wraps().values():
+        patch_directory = wrap.patch_directory
+        if not patch_directory or not wrap.source_filename:
             continue
-        directory = Path('subprojects', wrap_section['directory'])
+        directory = Path('subprojects', wrap.directory)
         if not directory.is_dir():
             continue
-        archive_path = Path('subprojects', 'packagecache', wrap_section['source_filename'])
+        archive_path = Path('subprojects', 'packagecache', wrap.source_filename)
         if not archive_path.exists():
             continue
-        lead_directory_missing = bool(wrap_section.get('lead_directory_missing', False)) # type: ignore
-        base_path = directory if lead_directory_missing else Path('subprojects')
-        archive_files = read_archive_files(archive_path, base_path)
+        base_path = directory if wrap.lead_directory_missing else Path('subprojects')
+        try:
+            archive_files = read_archive_files(wrap, base_path)
+        except ValueError as ex:
+            # stale or truncated archive
+            print(f'Skipping {directory}: {ex}')
+            continue
         directory_files = set(directory.glob('**/*'))
         new_files = directory_files - archive_files
         packagefiles = Path('subprojects', 'packagefiles', patch_directory)
@@ -14,9 +14,11 @@
 
 from __future__ import annotations
 import abc
+import argparse
 import configparser
 from contextlib import contextmanager
 import functools
+import hashlib
 import io
 import json
 import operator
@@ -26,6 +28,7 @@ import platform
 import re
 import subprocess
 import sys
+import threading
 import time
 import venv
 import typing as T
@@ -175,9 +178,12 @@ class CIConfig(T.Dict[str, ProjectCIConfig], _JSONFile):
         system = platform.system().lower()
         return T.cast('list[str]', self.get(f'broken_{system}', []))
 
+    @property
+    def global_build_options(self) -> list[str]:
+        return T.cast('list[str]', self.get('global_build_options', []))
+
     def get_option_arguments(self, name: str) -> list[str]:
-        global_opts = T.cast('list[str]', self.get('global_build_options', []))
-        opts = [o for o in global_opts if not o.startswith(f'{name}:')]
+        opts = [o for o in self.global_build_options if not o.startswith(f'{name}:')]
         opts += self.get(name, {}).get('build_options', [])
         return [f'-D{o}' for o in opts]
 
@@ -189,6 +195,54 @@ def read_wrap(name: str) -> configparser.ConfigParser:
     config.read(wrap_path(name), encoding='utf-8')
     return config
 
+class WrapFile:
+    '''Read-only view of a wrap file.  Use get_wrap() or load_all_wraps()
+       rather than constructing directly; use read_wrap() to get an
+       editable ConfigParser.'''
+
+    __slots__ = (
+        'name', 'directory', 'source_url', 'source_fallback_url',
+        'source_filename', 'source_hash', 'patch_directory',
+        'patch_filename', 'patch_hash', 'lead_directory_missing', 'provides',
+    )
+
+    def __init__(self, name: str, config: configparser.ConfigParser):
+        section = config['wrap-file'] if config.has_section('wrap-file') else config[config.sections()[0]]
+        self.name = name
+        self.directory: str = section.get('directory', name)
+        self.source_url: T.Optional[str] = section.get('source_url')
+        self.source_fallback_url: T.Optional[str] = section.get('source_fallback_url')
+        self.source_filename: T.Optional[str] = section.get('source_filename')
+        self.source_hash: T.Optional[str] = section.get('source_hash')
+        self.patch_directory: T.Optional[str] = section.get('patch_directory')
+        self.patch_filename: T.Optional[str] = section.get('patch_filename')
+        self.patch_hash: T.Optional[str] = section.get('patch_hash')
+        self.lead_directory_missing = bool(section.get('lead_directory_missing'))
+        self.provides: dict[str, str] = dict(config['provide']) if config.has_section('provide') else {}
+
+    def __repr__(self) -> str:
+        return f'<WrapFile: {self.name}>'
+
+# wrap name -> ((mtime_ns, size), parsed wrap)
+_wrap_cache: dict[str, tuple[tuple[int, int], WrapFile]] = {}
+
+def get_wrap(name: str) -> WrapFile:
+    '''Return the parsed wrap, reparsing only if the file has changed.'''
+    st = wrap_path(name).stat()
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _wrap_cache.get(name)
+    if cached and cached[0] == key:
+        return cached[1]
+    wrap = WrapFile(name, read_wrap(name))
+    _wrap_cache[name] = (key, wrap)
+    return wrap
+
+def load_all_wraps() -> dict[str, WrapFile]:
+    return {
+        path.stem: get_wrap(path.stem)
+        for path in sorted(Path('subprojects').glob('*.wrap'))
+    }
+
 def write_wrap(path: Path, config: configparser.ConfigParser) -> None:
     # configparser write() adds multiple trailing newlines, collapse them
     buf = io.StringIO()
@@ -196,6 +250,23 @@ def write_wrap(path: Path, config: configparser.ConfigParser) -> None:
     with path.open('w', encoding='utf-8') as f:
         f.write(buf.getvalue().rstrip('\n') + '\n')
 
+def replace_files(contents: T.Mapping[Path, str]) -> None:
+    '''Replace several text files together.  Everything is written to
+       temporary files before any file is replaced, so a failure while
+       writing leaves all of them unchanged.'''
+    temps: dict[Path, Path] = {}
+    try:
+        for path, text in contents.items():
+            temp = temp_path(path)
+            temps[path] = temp
+            with temp.open('w', encoding='utf-8') as f:
+                f.write(text)
+        for path, temp in temps.items():
+            os.replace(temp, path)
+    finally:
+        for temp in temps.values():
+            temp.unlink(missing_ok=True)
+
 @contextmanager
 def ci_group(title):
     if is_ci() or sys.stdout.isatty():
@@ -224,6 +295,84 @@ def is_msys() -> bool:
 def is_macos():
     return any(platform.mac_ver()[0])
 
+def available_memory() -> int | None:
+    '''Return the number of bytes of memory available for new processes,
+       or None if it can't be determined on this platform.'''
+    try:
+        with open('/proc/meminfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def load_average() -> float | None:
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+def cache_dir(name: str) -> Path:
+    '''Return the per-user directory for the named cache, creating it if
+       needed.  WRAPDB_CACHE_DIR overrides the platform default.'''
+    if 'WRAPDB_CACHE_DIR' in os.environ:
+        base = Path(os.environ['WRAPDB_CACHE_DIR'])
+    elif platform.system() == 'Windows' and 'LOCALAPPDATA' in os.environ:
+        base = Path(os.environ['LOCALAPPDATA'], 'wrapdb')
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'), 'wrapdb')
+    path = base / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def checkout_id() -> str:
+    '''Return a short identifier for the current checkout, for caches that
+       describe the working tree rather than shared content.'''
+    return hashlib.sha256(str(Path.cwd().resolve()).encode()).hexdigest()[:16]
+
+def file_sha256(path: Path) -> str:
+    '''Hash a file without reading it all into memory.'''
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        while True:
+            buf = f.read(1 << 20)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+def temp_path(path: Path) -> Path:
+    '''Return a name next to path to write its replacement under, unique
+       to this process and thread.'''
+    return path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.new')
+
+def write_json_atomic(path: Path, data: T.Any, **kwargs: T.Any) -> None:
+    '''Write data to path as JSON through a temporary file, so that
+       concurrent readers never see a partial file.  kwargs are passed to
+       json.dump().'''
+    temp = temp_path(path)
+    try:
+        with temp.open('w', encoding='utf-8') as f:
+            json.dump(data, f, **kwargs)
+            f.write('\n')
+        os.replace(temp, path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+def positive_int(value: str) -> int:
+    '''argparse type for counts that must be at least 1.'''
+    try:
+        n = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid int value: {value!r}')
+    if n < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1: {value}')
+    return n
+
 @functools.lru_cache
 def venv_meson_path() -> Path:
     if is_ci():
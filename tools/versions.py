@@ -16,21 +16,20 @@
 
 from __future__ import annotations
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
-from hashlib import sha256
-from itertools import count
 import json
 import os
 from pathlib import Path
 import re
 import subprocess
 import sys
-import time
 import typing as T
 
-import requests
-
-from utils import Releases, read_wrap, wrap_path
+from downloadcache import DownloadCache
+from http_client import get_client
+from metadata import MetadataStore
+from utils import Releases, get_wrap, positive_int, replace_files, wrap_path
 
 WRAP_URL_TEMPLATE = (
     'https://github.com/mesonbuild/wrapdb/blob/master/subprojects/{0}.wrap'
@@ -42,6 +41,10 @@ DEPRECATED_WRAPS = set([
     # replaced with doctest
     'onqtam-doctest'
 ])
+ANITYA_ITEMS_PER_PAGE = 250
+ANITYA_CONCURRENCY = 4
+# seconds before cached Anitya responses are revalidated
+ANITYA_CACHE_TTL = 15 * 60
 
 
 class AnityaPackageList(T.TypedDict):
@@ -60,35 +63,30 @@ class AnityaPackage(T.TypedDict):
     version: str
 
 
+def get_anitya_page(page: int) -> AnityaPackageList:
+    # the client retries gateway timeouts
+    return json.loads(get_client().get_cached(
+        f'https://release-monitoring.org/api/v2/packages/'
+        f'?distribution=Meson%20WrapDB'
+        f'&items_per_page={ANITYA_ITEMS_PER_PAGE}'
+        f'&page={page}',
+        ANITYA_CACHE_TTL
+    ))
+
+
 @cache
 def get_upstream_versions() -> dict[str, str]:
     '''Query Anitya and return a dict: wrap_name -> upstream_version.'''
 
-    items_per_page = 250
-    versions = {}
-    for i in count(1):
-        for attempt in range(3):
-            if attempt > 0:
-                time.sleep(5)
-            resp = requests.get(
-                f'https://release-monitoring.org/api/v2/packages/'
-                f'?distribution=Meson%20WrapDB'
-                f'&items_per_page={items_per_page}'
-                f'&page={i}'
-            )
-            # retry a few times on gateway timeout
-            if resp.status_code != 504:
-                resp.raise_for_status()
-                break
-        else:
-            raise Exception('Repeated gateway timeouts querying Anitya')
-        packages: AnityaPackageList = resp.json()
-        versions.update({
-            package['name']: package['stable_version']
-            for package in packages['items']
-        })
-        if len(packages['items']) < items_per_page:
-            break
+    first = get_anitya_page(1)
+    pages = -(-first['total_items'] // ANITYA_ITEMS_PER_PAGE)
+    with ThreadPoolExecutor(ANITYA_CONCURRENCY) as executor:
+        rest = list(executor.map(get_anitya_page, range(2, pages + 1)))
+    versions = {
+        package['name']: package['stable_version']
+        for packages in [first] + rest
+        for package in packages['items']
+    }
 
     def sub(name: str, old: str, new: str) -> None:
         if name in versions:
@@ -119,16 +117,13 @@ def get_wrap_versions() -> dict[str, str]:
 
 def get_port_wraps() -> set[str]:
     '''Return the names of wraps that have a patch directory.'''
-    ports = set()
-    for name, info in Releases.load().items():
-        wrap = read_wrap(name)
-        if wrap.has_option('wrap-file', 'patch_directory'):
-            ports.add(name)
-    return ports
+    with MetadataStore.open() as store:
+        return set(store.ports())
 
 
-def update_wrap(name: str, old_ver: str, new_ver: str) -> None:
-    '''Try to update the specified wrap file from old_ver to new_ver.'''
+def get_updated_wrap(name: str, old_ver: str, new_ver: str) -> str:
+    '''Return the contents of the specified wrap file updated from
+       old_ver to new_ver.'''
 
     # read wrap file
     path = wrap_path(name)
@@ -157,27 +152,15 @@ def update_wrap(name: str, old_ver: str, new_ver: str) -> None:
                 source_url = v.strip()
         lines[i] = line
 
-    # update source hash
-    resp = requests.get(source_url, stream=True, headers={
-        'User-Agent': 'wrapdb/0',
-    })
-    resp.raise_for_status()
-    hash = sha256()
-    while True:
-        buf = resp.raw.read(1 << 20)
-        if not buf:
-            break
-        hash.update(buf)
+    # update source hash; keep the download for later tools
+    source_hash = DownloadCache().fetch([source_url]).name
     for i, line in enumerate(lines):
         if '=' in line:
             k, v = line.split('=', 1)
             if k.strip() == 'source_hash':
-                lines[i] = f'source_hash = {hash.hexdigest()}\n'
+                lines[i] = f'source_hash = {source_hash}\n'
                 break
-
-    # write
-    with path.open('w', encoding='utf-8') as f:
-        f.write(''.join(lines))
+    return ''.join(lines)
 
 
 def update_revisions(args: Namespace) -> None:
@@ -226,23 +209,35 @@ def do_autoupdate(args: Namespace) -> None:
         if not args.port:
             names = [name for name in names if name not in ports]
 
-    # update
+    def prepare(name: str) -> str:
+        if name not in cur_vers:
+            raise ValueError('deprecated or unknown wrap; no current version')
+        if name in ports:
+            # manual packagefiles changes will also be needed
+            print(f'Updating {name}.wrap and releases.json...')
+        else:
+            print(f'Updating {name}...')
+        return get_updated_wrap(name, cur_vers[name], upstream_vers[name])
+
+    # download and hash the new sources in parallel, then write everything
+    # that succeeded at once
+    # unknown names are reported as failures by prepare()
+    names = [name for name in names if cur_vers.get(name) != upstream_vers[name]]
+    updates: dict[Path, str] = {}
     failures = 0
-    for name in names:
-        cur_ver, upstream_ver = cur_vers[name], upstream_vers[name]
-        try:
-            if cur_ver != upstream_ver:
-                if name in ports:
-                    # manual packagefiles changes will also be needed
-                    print(f'Updating {name}.wrap and releases.json...')
-                else:
-                    print(f'Updating {name}...')
-                update_wrap(name, cur_ver, upstream_ver)
-                releases[name]['versions'].insert(0, f'{upstream_ver}-1')
-                releases.save()
-        except Exception as e:
-            print(e, file=sys.stderr)
-            failures += 1
+    with ThreadPoolExecutor(args.jobs) as executor:
+        futures = {name: executor.submit(prepare, name) for name in names}
+        for name, future in futures.items():
+            try:
+                updates[wrap_path(name)] = future.result()
+            except Exception as e:
+                print(f'{name}: {e}', file=sys.stderr)
+                failures += 1
+            else:
+                releases[name]['versions'].insert(0, f'{upstream_vers[name]}-1')
+    if updates:
+        updates[Path(Releases.FILENAME)] = releases.encode()
+        replace_files(updates)
     if failures:
         raise Exception(f"Couldn't update {failures} wraps")
 
@@ -278,9 +273,7 @@ def do_commit(args: Namespace) -> None:
     commit_files: list[str | Path] = [
         'ci_config.json', 'releases.json', wrap_path(name)
     ]
-    patch_dir = read_wrap(name).get(
-        'wrap-file', 'patch_directory', fallback=None
-    )
+    patch_dir = get_wrap(name).patch_directory
     if patch_dir:
         commit_files.append(f'subprojects/packagefiles/{patch_dir}')
 
@@ -359,9 +352,7 @@ def do_list(args: Namespace) -> None:
                     'wrapdb': cur_vers[name],
                     'upstream': upstream_vers.get(name),
                     'port': name in ports,
-                    'source': read_wrap(name).get(
-                        'wrap-file', 'source_url'
-                    )
+                    'source': get_wrap(name).source_url
                 } for name in wraps
             }, sys.stdout, indent=2, sort_keys=True
         )
@@ -418,6 +409,10 @@ def main() -> None:
         '-r', '--revision', action='store_true',
         help='increment wrap revision and do nothing else'
     )
+    autoupdate.add_argument(
+        '-j', '--jobs', type=positive_int, default=8,
+        help='number of sources to download at once (default: 8)'
+    )
     autoupdate.set_defaults(func=do_autoupdate)
 
     commit = subparsers.add_parser(